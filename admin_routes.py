@@ -4,8 +4,19 @@ from functools import wraps
 from models import (
     db, User, Role, UserRole, Year, Program, Group, UserGroup, 
     AuditLog, NotificationTemplate, Notification, Question, ExamAttempt,
-    get_user_permissions, has_permission, log_audit, get_user_roles
+    get_user_permissions, has_permission, log_audit, get_user_roles, bump_state_version,
+    invalidate_permissions, get_permission_mask, permission_mask, PERMISSION_BITS,
+    get_stats_counters, get_score_rollups, SCORE_BUCKETS, ItemStat
 )
+from exam_cache import invalidate_question_bank
+from exam_events import publish_deadline
+from password_hashing import hashing_metrics
+from audit_writer import flush_audit_events, audit_writer_metrics
+from audit_search import search_audit_logs, parse_audit_cursor
+from performance_report import (
+    SORT_COLUMNS, PERFORMANCE_PAGE_SIZE, get_performance_summary, get_performance_page
+)
+from cohort_report import load_organization_tree, get_cohort_stats
 from datetime import datetime, timedelta
 import json
 import csv
@@ -21,12 +32,16 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 def require_permission(permission):
     """Decorator to require specific permission"""
+    if permission not in PERMISSION_BITS:
+        raise ValueError(f'Unknown permission: {permission}')
+    bit = PERMISSION_BITS[permission]
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             if not current_user.is_authenticated:
                 return redirect(url_for('login'))
-            if not has_permission(current_user.id, permission):
+            if not get_permission_mask(current_user.id) & bit:
                 flash('You do not have permission to access this resource.', 'error')
                 return redirect(url_for('admin.dashboard'))
             return f(*args, **kwargs)
@@ -39,7 +54,7 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated:
             return redirect(url_for('login'))
-        if not has_permission(current_user.id, 'system.admin'):
+        if not get_permission_mask(current_user.id) & PERMISSION_BITS['system.admin']:
             flash('Admin access required.', 'error')
             return redirect(url_for('admin.dashboard'))
         return f(*args, **kwargs)
@@ -49,29 +64,23 @@ def admin_required(f):
 # Admin Dashboard
 # =============================================================================
 
+# Any of these grants access to the admin area
+_ADMIN_AREA_MASK = permission_mask(['user.read', 'question.read', 'exam.read', 'report.read'])
+
 @admin_bp.route('/')
 @login_required
 def dashboard():
     """Admin dashboard with overview statistics"""
-    if not any(has_permission(current_user.id, perm) for perm in 
-               ['user.read', 'question.read', 'exam.read', 'report.read']):
+    if not get_permission_mask(current_user.id) & _ADMIN_AREA_MASK:
         flash('You do not have admin access.', 'error')
         return redirect(url_for('home'))
     
-    # Get statistics
-    stats = {
-        'total_users': User.query.count(),
-        'active_users': User.query.filter_by(is_active=True).count(),
-        'total_questions': Question.query.count(),
-        'total_exams': ExamAttempt.query.count(),
-        'completed_exams': ExamAttempt.query.filter_by(is_completed=True).count(),
-        'total_roles': Role.query.count(),
-        'total_audit_logs': AuditLog.query.count()
-    }
+    # Get statistics (incrementally maintained counters, constant time)
+    stats = get_stats_counters()
     
-    # Recent activity
-    recent_audits = AuditLog.query.order_by(AuditLog.timestamp.desc()).limit(10).all()
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    # Recent activity; ids follow insertion order, so the primary key serves the sort
+    recent_audits = AuditLog.query.order_by(AuditLog.id.desc()).limit(10).all()
+    recent_users = User.query.order_by(User.id.desc()).limit(5).all()
     
     return render_template('admin/dashboard.html', 
                          stats=stats, 
@@ -91,7 +100,8 @@ def users():
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
     
-    query = User.query
+    # Role badges for the whole page in one extra query
+    query = User.query.options(db.selectinload(User.user_roles).joinedload(UserRole.role))
     
     if search:
         query = query.filter(
@@ -165,6 +175,7 @@ def create_user():
                 )
                 db.session.add(user_role)
             
+            invalidate_permissions()
             db.session.commit()
             
             # Log audit
@@ -220,6 +231,7 @@ def edit_user(user_id):
                 )
                 db.session.add(user_role)
             
+            invalidate_permissions()
             db.session.commit()
             
             # Log audit
@@ -290,7 +302,9 @@ def questions():
 def question_detail(question_id):
     """Question detail view"""
     question = Question.query.get_or_404(question_id)
-    return render_template('admin/question_detail.html', question=question)
+    # Precomputed item analysis; answers are never loaded
+    item_stat = db.session.get(ItemStat, question_id)
+    return render_template('admin/question_detail.html', question=question, item_stat=item_stat)
 
 @admin_bp.route('/questions/create', methods=['GET', 'POST'])
 @require_permission('question.create')
@@ -313,6 +327,7 @@ def create_question():
             )
             
             db.session.add(question)
+            invalidate_question_bank()
             db.session.commit()
             
             # Log audit
@@ -336,8 +351,10 @@ def create_question():
 @admin_bp.route('/organizations')
 @require_permission('org.read')
 def organizations():
-    """Organization hierarchy view"""
-    years = Year.query.filter_by(is_active=True).all()
+    """Organization hierarchy view with cached cohort statistics per node"""
+    years = load_organization_tree()
+    cohort_stats = get_cohort_stats(years)
+    db.session.commit()
     
     # Calculate statistics
     total_programs = sum(len(year.programs) for year in years)
@@ -346,6 +363,7 @@ def organizations():
     
     return render_template('admin/organizations.html', 
                          years=years,
+                         cohort_stats=cohort_stats,
                          stats={
                              'total_programs': total_programs,
                              'total_groups': total_groups,
@@ -387,6 +405,34 @@ def create_year():
     
     return render_template('admin/create_year.html')
 
+# =============================================================================
+# Exam Sessions
+# =============================================================================
+
+@admin_bp.route('/exams/<int:attempt_id>/extend', methods=['POST'])
+@require_permission('session.update')
+def extend_exam(attempt_id):
+    """Grant extra time to an in-progress attempt"""
+    attempt = ExamAttempt.query.get_or_404(attempt_id)
+    if attempt.status != 'in_progress':
+        return jsonify({'error': 'Exam is no longer active'}), 400
+    
+    minutes = request.form.get('minutes', type=int)
+    if not minutes or minutes < 1 or minutes > 120:
+        return jsonify({'error': 'Extension must be between 1 and 120 minutes'}), 400
+    
+    old_extension = attempt.extended_seconds or 0
+    attempt.extended_seconds = old_extension + minutes * 60
+    bump_state_version(attempt.id)
+    db.session.commit()
+    publish_deadline(attempt)
+    
+    log_audit(current_user.id, 'EXTEND_EXAM', 'ExamAttempt', attempt.id,
+             {'extended_seconds': old_extension}, {'extended_seconds': attempt.extended_seconds},
+             request.remote_addr, request.headers.get('User-Agent'))
+    
+    return jsonify({'success': True, 'extended_seconds': attempt.extended_seconds})
+
 # =============================================================================
 # Audit Logs
 # =============================================================================
@@ -394,26 +440,32 @@ def create_year():
 @admin_bp.route('/audit-logs')
 @require_permission('audit.read')
 def audit_logs():
-    """View audit logs"""
-    page = request.args.get('page', 1, type=int)
+    """View audit logs, newest first, keyset-paginated over (timestamp, id)"""
     user_filter = request.args.get('user', '')
     action_filter = request.args.get('action', '')
     resource_filter = request.args.get('resource', '')
-    
-    query = AuditLog.query
-    
-    if user_filter:
-        query = query.filter_by(user_id=int(user_filter))
-    
-    if action_filter:
-        query = query.filter(AuditLog.action.contains(action_filter))
-    
-    if resource_filter:
-        query = query.filter(AuditLog.resource_type.contains(resource_filter))
-    
-    logs = query.order_by(AuditLog.timestamp.desc()).paginate(page=page, per_page=50, error_out=False)
-    
-    return render_template('admin/audit_logs.html', logs=logs)
+    resource_id_filter = request.args.get('resource_id', '')
+    text_filter = request.args.get('q', '')
+    include_archived = request.args.get('archived') == '1'
+    cursor = parse_audit_cursor(request.args.get('before'))
+    
+    # Show this worker's own queued events too
+    flush_audit_events()
+    logs, next_cursor = search_audit_logs(
+        user_id=int(user_filter) if user_filter.isdigit() else None,
+        action=action_filter,
+        resource_type=resource_filter,
+        resource_id=resource_id_filter,
+        text=text_filter,
+        before=cursor,
+        include_archived=include_archived
+    )
+    
+    return render_template('admin/audit_logs.html', logs=logs, next_cursor=next_cursor,
+                         is_first_page=cursor is None,
+                         user_filter=user_filter, action_filter=action_filter,
+                         resource_filter=resource_filter, resource_id_filter=resource_id_filter,
+                         text_filter=text_filter, include_archived=include_archived)
 
 # =============================================================================
 # Import/Export
@@ -507,56 +559,132 @@ def export_questions():
 # Reports and Analytics
 # =============================================================================
 
+# Weeks of history in the reports dashboard trend chart
+TREND_WEEKS = 12
+
 @admin_bp.route('/reports')
 @require_permission('report.read')
 def reports():
     """Reports dashboard"""
     # Basic statistics
-    stats = {
-        'total_users': User.query.count(),
-        'active_users': User.query.filter_by(is_active=True).count(),
-        'total_questions': Question.query.count(),
-        'total_exams': ExamAttempt.query.count(),
-        'completed_exams': ExamAttempt.query.filter_by(is_completed=True).count(),
-        'avg_score': db.session.query(db.func.avg(ExamAttempt.score)).filter_by(is_completed=True).scalar() or 0
-    }
+    stats = get_stats_counters()
+    stats['avg_score'] = stats['score_sum'] / stats['scored_exams'] if stats['scored_exams'] else 0
     
     # Recent exam attempts
-    recent_exams = ExamAttempt.query.filter_by(is_completed=True)\
+    # Scores are stored columns; only the user rows are joined in
+    recent_exams = ExamAttempt.query.options(db.joinedload(ExamAttempt.user))\
+        .filter_by(is_completed=True)\
         .order_by(ExamAttempt.end_time.desc()).limit(10).all()
+
+    # Charts read the weekly rollups only, never the attempt rows
+    weekly = get_score_rollups('week')
+    score_distribution = {
+        f'{lowest}-{highest}': sum(week['histogram'][column] for week in weekly)
+        for column, lowest, highest in SCORE_BUCKETS
+    }
+    score_trend = weekly[-TREND_WEEKS:]
     
-    return render_template('admin/reports.html', stats=stats, recent_exams=recent_exams)
+    return render_template('admin/reports.html', stats=stats, recent_exams=recent_exams,
+                         score_distribution=score_distribution, score_trend=score_trend)
+
+@admin_bp.route('/reports/score-trends')
+@require_permission('report.read')
+def score_trends():
+    """Score analytics series from the rollups, filterable by test set, program and group"""
+    period = request.args.get('period', 'week')
+    if period not in ('day', 'week'):
+        return jsonify({'error': 'period must be day or week'}), 400
+    since = request.args.get('since')
+    try:
+        since = datetime.strptime(since, '%Y-%m-%d').date() if since else None
+    except ValueError:
+        return jsonify({'error': 'since must be YYYY-MM-DD'}), 400
+
+    series = get_score_rollups(
+        period, since,
+        test_set=request.args.get('test_set') or None,
+        program_id=request.args.get('program_id', type=int),
+        group_id=request.args.get('group_id', type=int)
+    )
+    for point in series:
+        point['period_start'] = point['period_start'].isoformat()
+    return jsonify({'period': period, 'series': series})
 
 @admin_bp.route('/reports/user-performance')
 @require_permission('report.read')
 def user_performance_report():
-    """User performance report"""
-    users = User.query.join(ExamAttempt).filter(ExamAttempt.is_completed == True).all()
-    
-    performance_data = []
-    for user in users:
-        attempts = ExamAttempt.query.filter_by(user_id=user.id, is_completed=True).all()
-        if attempts:
-            avg_score = sum(a.score or 0 for a in attempts) / len(attempts)
-            best_score = max(a.score or 0 for a in attempts)
-            performance_data.append({
-                'user': user,
-                'attempts_count': len(attempts),
-                'avg_score': round(avg_score, 2),
-                'best_score': best_score,
-                'last_attempt': max(a.end_time for a in attempts if a.end_time)
-            })
-    
-    performance_data.sort(key=lambda x: x['avg_score'], reverse=True)
-    
-    # Calculate summary statistics
-    summary_stats = {
-        'total_students': len(performance_data),
-        'avg_score': round(sum(p['avg_score'] for p in performance_data) / len(performance_data), 1) if performance_data else 0,
-        'best_score': max(p['best_score'] for p in performance_data) if performance_data else 0,
-        'total_attempts': sum(p['attempts_count'] for p in performance_data) if performance_data else 0
-    }
-    
+    """User performance report: one aggregate query per page, cached until results change"""
+    sort = request.args.get('sort', 'avg')
+    if sort not in SORT_COLUMNS:
+        sort = 'avg'
+    direction = 'asc' if request.args.get('dir') == 'asc' else 'desc'
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = PERFORMANCE_PAGE_SIZE
+
+    summary_stats = get_performance_summary()
+    total_pages = max((summary_stats['total_students'] + per_page - 1) // per_page, 1)
+    page = min(page, total_pages)
+    performance_data = get_performance_page(sort, direction == 'desc', page, per_page)
+    top_performers = get_performance_page('avg', True, 1, 5)
+
     return render_template('admin/user_performance_report.html', 
                          performance_data=performance_data,
-                         summary_stats=summary_stats)
+                         top_performers=top_performers,
+                         summary_stats=summary_stats,
+                         sort=sort,
+                         direction=direction,
+                         page=page,
+                         total_pages=total_pages,
+                         rank_offset=(page - 1) * per_page)
+
+@admin_bp.route('/reports/cohorts')
+@require_permission('report.read')
+def cohort_report():
+    """Average, distribution and completion rate per year, program and group"""
+    years = load_organization_tree(include_inactive=request.args.get('all') == '1')
+    cohort_stats = get_cohort_stats(years)
+    db.session.commit()
+    return render_template('admin/cohort_report.html', years=years, cohort_stats=cohort_stats,
+                         show_all=request.args.get('all') == '1')
+
+# Items with fewer responses are left out of the item analysis report
+ITEM_MIN_RESPONSES = 20
+ITEM_REPORT_SIZE = 50
+
+@admin_bp.route('/reports/item-analysis')
+@require_permission('report.read')
+def item_analysis_report():
+    """Hardest (lowest p-value) or least discriminating items, read from item_stats"""
+    sort = 'discrimination' if request.args.get('sort') == 'discrimination' else 'p_value'
+    test_set = request.args.get('test_set', '')
+
+    query = db.session.query(ItemStat, Question)\
+        .join(Question, ItemStat.question_id == Question.id)\
+        .filter(ItemStat.responses >= ITEM_MIN_RESPONSES, getattr(ItemStat, sort).isnot(None))
+    if test_set:
+        query = query.filter(Question.test_set == test_set)
+    items = query.order_by(getattr(ItemStat, sort), ItemStat.question_id).limit(ITEM_REPORT_SIZE).all()
+
+    test_sets = db.session.query(Question.test_set).distinct().all()
+    return render_template('admin/item_analysis_report.html',
+                         items=items,
+                         sort=sort,
+                         test_set=test_set,
+                         test_sets=[t[0] for t in test_sets if t[0]],
+                         min_responses=ITEM_MIN_RESPONSES)
+
+# =============================================================================
+# System Metrics
+# =============================================================================
+
+@admin_bp.route('/metrics/password-hashing')
+@admin_required
+def password_hashing_metrics():
+    """This worker's password hashing pool: queue depth, wait times, shed requests"""
+    return jsonify({'pid': os.getpid(), 'password_hashing': hashing_metrics()})
+
+@admin_bp.route('/metrics/audit-writer')
+@admin_required
+def audit_writer_metrics_view():
+    """This worker's audit writer: queue depth, batches written, synchronous fallbacks"""
+    return jsonify({'pid': os.getpid(), 'audit_writer': audit_writer_metrics()})
@@ -0,0 +1,274 @@
+"""
+Optional write-behind journal for exam answers.
+
+With ANSWER_WRITE_BEHIND enabled, answer saves are appended (and fsynced) to a
+per-worker journal segment and acknowledged immediately. A background thread
+upserts them into the Answer table in large batches. A segment is deleted only
+after its batch has been committed; segments left behind by a crashed or
+stopped worker are replayed on startup.
+
+Every write is "newer answered_at wins", so flushes from different workers and
+replays can run in any order without overwriting a later selection.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, startup replays every segment
+    fcntl = None
+
+from models import db, upsert_answer_rows, upsert_answers
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PATTERN = 'answers-*.jnl'
+
+
+def _read_segment(path):
+    """Yield (attempt_id, question_id, answer, ts) entries from a journal segment"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Torn final line from a crash mid-write; it was never acknowledged
+                continue
+            for question_id, answer in entry['q'].items():
+                yield entry['a'], int(question_id), answer, entry['t']
+
+
+def _merge_latest(entries, latest):
+    """Fold entries into {(attempt_id, question_id): (answer, ts)}, keeping the newest"""
+    for attempt_id, question_id, answer, ts in entries:
+        key = (attempt_id, question_id)
+        if key not in latest or latest[key][1] <= ts:
+            latest[key] = (answer, ts)
+    return latest
+
+
+def _to_rows(latest):
+    return [
+        {'attempt_id': attempt_id, 'question_id': question_id,
+         'selected_answer': answer, 'answered_at': datetime.utcfromtimestamp(ts)}
+        for (attempt_id, question_id), (answer, ts) in latest.items()
+    ]
+
+
+class AnswerJournal:
+    """Append-only answer journal with a batched background flusher"""
+
+    def __init__(self, app, directory, flush_interval=1.0, fsync=True):
+        self.app = app
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._lock = threading.Lock()        # pending answers and the active segment
+        self._flush_lock = threading.Lock()  # one database flush at a time
+        self._pending = {}
+        self._retained = []                  # segments whose flush failed, kept for replay
+        self._file = None
+        self._path = None
+        self._seq = 0
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        os.makedirs(directory, exist_ok=True)
+
+    # -- segments ------------------------------------------------------------
+
+    def _open_segment(self):
+        self._seq += 1
+        name = f'answers-{os.getpid()}-{int(time.time())}-{self._seq}.jnl'
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, 'a', encoding='utf-8')
+        if fcntl:
+            # Held for the segment's lifetime so replay skips live segments
+            fcntl.flock(self._file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    @staticmethod
+    def _release(file, path):
+        file.close()
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _ensure_started(self):
+        """Open a segment and start the flusher in this process. Caller holds _lock."""
+        if self._pid == os.getpid():
+            return
+        # First use, or first use after a fork: state inherited from the parent is not ours
+        self._pid = os.getpid()
+        self._pending = {}
+        self._retained = []
+        self._open_segment()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='answer-journal', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    # -- public API ------------------------------------------------------------
+
+    def record(self, attempt_id, selections):
+        """Durably journal {question_id: answer} for an attempt"""
+        ts = time.time()
+        line = json.dumps({'a': attempt_id, 'q': selections, 't': ts}) + '\n'
+        with self._lock:
+            self._ensure_started()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            for question_id, answer in selections.items():
+                self._pending[(attempt_id, int(question_id))] = (answer, ts)
+
+    def flush(self):
+        """Write all pending answers to the database; returns the number of rows"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending or self._pid != os.getpid():
+                    return 0
+                segment = (self._file, self._path)
+                pending = self._pending
+                self._pending = {}
+                self._open_segment()
+
+            try:
+                with self.app.app_context():
+                    try:
+                        upsert_answer_rows(_to_rows(pending), only_if_newer=True)
+                        db.session.commit()
+                    except Exception:
+                        db.session.rollback()
+                        raise
+            except Exception:
+                logger.exception('Answer journal flush failed; retrying on the next cycle')
+                with self._lock:
+                    _merge_latest(((a, q, ans, ts) for (a, q), (ans, ts) in pending.items()), self._pending)
+                    self._retained.append(segment)
+                return 0
+
+            for file, path in self._retained + [segment]:
+                self._release(file, path)
+            self._retained = []
+            return len(pending)
+
+    def flush_attempt(self, attempt_id):
+        """Upsert everything journaled for one attempt, from every worker's segments.
+        Runs in the caller's session; the caller commits.
+        """
+        return self.flush_attempts([attempt_id])
+
+    def flush_attempts(self, attempt_ids):
+        """Upsert everything journaled for the given attempts, reading every worker's
+        segments once. Runs in the caller's session; the caller commits.
+        """
+        attempt_ids = set(attempt_ids)
+        if not attempt_ids:
+            return 0
+        with self._lock:
+            latest = {key: value for key, value in self._pending.items() if key[0] in attempt_ids}
+
+        for path in glob.glob(os.path.join(self.directory, SEGMENT_PATTERN)):
+            try:
+                _merge_latest((e for e in _read_segment(path) if e[0] in attempt_ids), latest)
+            except FileNotFoundError:
+                # Released meanwhile, so its answers are already committed
+                continue
+
+        upsert_answer_rows(_to_rows(latest), only_if_newer=True)
+        return len(latest)
+
+    def replay(self):
+        """Apply segments left behind by workers that are no longer running"""
+        latest = {}
+        claimed = []
+        for path in sorted(glob.glob(os.path.join(self.directory, SEGMENT_PATTERN))):
+            if path == self._path:
+                continue
+            file = open(path, encoding='utf-8')
+            if fcntl:
+                try:
+                    fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    # Owned by a live worker
+                    file.close()
+                    continue
+            _merge_latest(_read_segment(path), latest)
+            claimed.append((file, path))
+
+        if latest:
+            with self.app.app_context():
+                upsert_answer_rows(_to_rows(latest), only_if_newer=True)
+                db.session.commit()
+            logger.info('Replayed %d journaled answers from %d segments', len(latest), len(claimed))
+
+        for file, path in claimed:
+            self._release(file, path)
+        return len(latest)
+
+    def stop(self):
+        """Stop the flusher, write what is left and remove the empty active segment"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+        with self._lock:
+            if not self._pending and not self._retained and self._file is not None:
+                self._release(self._file, self._path)
+                self._file = None
+                self._pid = None
+
+
+# =============================================================================
+# Module-level helpers used by the routes
+# =============================================================================
+
+_journal = None
+
+def init_answer_journal(app):
+    """Enable write-behind mode for this process and replay orphaned segments"""
+    global _journal
+    directory = app.config.get('ANSWER_JOURNAL_DIR') or os.path.join(app.instance_path, 'answer_journal')
+    _journal = AnswerJournal(
+        app,
+        directory,
+        flush_interval=app.config.get('ANSWER_FLUSH_INTERVAL', 1.0),
+        fsync=app.config.get('ANSWER_JOURNAL_FSYNC', True)
+    )
+    _journal.replay()
+    atexit.register(_journal.stop)
+    return _journal
+
+def store_answers(attempt_id, selections):
+    """Persist {question_id: answer}: journaled in write-behind mode, otherwise upserted and committed"""
+    if _journal is not None:
+        _journal.record(attempt_id, selections)
+    else:
+        upsert_answers(attempt_id, selections)
+        db.session.commit()
+
+def flush_attempt_answers(attempt_id):
+    """Make sure every journaled answer of an attempt is in the caller's transaction"""
+    if _journal is not None:
+        _journal.flush_attempt(attempt_id)
+
+def flush_attempts_answers(attempt_ids):
+    """flush_attempt_answers() for a batch of attempts, with one pass over the journal"""
+    if _journal is not None:
+        _journal.flush_attempts(attempt_ids)
@@ -1,14 +1,41 @@
+import os
 from flask import Flask
 from flask_login import LoginManager
 from models import db, User, init_sample_questions
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'change-me'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///toeic.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///toeic.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Write-behind answer journal (see answer_journal.py); off unless ANSWER_WRITE_BEHIND=1
+app.config['ANSWER_WRITE_BEHIND'] = os.environ.get('ANSWER_WRITE_BEHIND', '').lower() in ('1', 'true', 'yes')
+app.config['ANSWER_FLUSH_INTERVAL'] = float(os.environ.get('ANSWER_FLUSH_INTERVAL', '1.0'))
+# In-process auto-submit of expired attempts (see exam_sweeper.py); seconds between sweeps, 0 = off
+app.config['EXAM_SWEEP_INTERVAL'] = float(os.environ.get('EXAM_SWEEP_INTERVAL', '0'))
+# Bounded password hashing pool (see password_hashing.py)
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', '16'))
+if os.environ.get('PASSWORD_HASH_METHOD'):
+    app.config['PASSWORD_HASH_METHOD'] = os.environ['PASSWORD_HASH_METHOD']
+# Failed-login throttling (see login_throttle.py); "memory" per worker or "sqlite" per host
+app.config['LOGIN_THROTTLE_BACKEND'] = os.environ.get('LOGIN_THROTTLE_BACKEND', 'memory')
+# Background audit-log writer (see audit_writer.py); AUDIT_ASYNC=0 writes every event inline
+app.config['AUDIT_ASYNC'] = os.environ.get('AUDIT_ASYNC', '1').lower() not in ('0', 'false', 'no')
+app.config['AUDIT_QUEUE_SIZE'] = int(os.environ.get('AUDIT_QUEUE_SIZE', '10000'))
+app.config['AUDIT_BATCH_SIZE'] = int(os.environ.get('AUDIT_BATCH_SIZE', '200'))
+# Audit-log retention (see audit_archive.py); older whole days move to gzip segments
+app.config['AUDIT_RETENTION_DAYS'] = int(os.environ.get('AUDIT_RETENTION_DAYS', '365'))
+app.config['AUDIT_ARCHIVE_DIR'] = os.environ.get('AUDIT_ARCHIVE_DIR',
+                                                 os.path.join(app.instance_path, 'audit_archive'))
 
 db.init_app(app)
 
+from password_hashing import init_password_hashing
+init_password_hashing(app)
+
+from login_throttle import init_login_throttle
+init_login_throttle(app)
+
 login_manager = LoginManager()
 login_manager.login_view = 'login'
 login_manager.init_app(app)
@@ -33,4 +60,21 @@ with app.app_context():
     db.create_all()
     init_sample_questions()
 
+    # Free-text audit search index (SQLite FTS5); created on first start
+    from audit_search import install_audit_fts
+    install_audit_fts(db.engine)
+
+if app.config['ANSWER_WRITE_BEHIND']:
+    from answer_journal import init_answer_journal
+    init_answer_journal(app)
+
+if app.config['AUDIT_ASYNC']:
+    from audit_writer import init_audit_writer
+    from models import write_audit_rows
+    init_audit_writer(app, write_audit_rows)
+
+if app.config['EXAM_SWEEP_INTERVAL'] > 0:
+    from exam_sweeper import start_exam_sweeper
+    start_exam_sweeper(app, app.config['EXAM_SWEEP_INTERVAL'])
+
 import routes  # keep this as the last line
\ No newline at end of file
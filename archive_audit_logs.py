@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Move old audit logs into the compressed archive (see audit_archive.py)
+
+Whole days older than AUDIT_RETENTION_DAYS are written to gzip NDJSON segments
+under AUDIT_ARCHIVE_DIR and leave a thin index row behind; legacy rows have
+their User-Agent text moved into the user_agents table. Run it from cron.
+
+    python archive_audit_logs.py                  # configured retention
+    python archive_audit_logs.py --days 90        # keep 90 days live
+    python archive_audit_logs.py --vacuum         # then reclaim space (SQLite)
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from audit_archive import archive_audit_logs, compact_user_agents, vacuum_database, archive_directory
+
+def main(days=None, vacuum=False):
+    with app.app_context():
+        days = days if days is not None else app.config['AUDIT_RETENTION_DAYS']
+        print(f"🔄 Archiving audit logs older than {days} days to {archive_directory()}...")
+
+        try:
+            archived = archive_audit_logs(days)
+            print(f"   {archived} events archived")
+            compacted = compact_user_agents()
+            print(f"   {compacted} legacy rows compacted")
+            if vacuum and vacuum_database():
+                print("   Database vacuumed")
+            print("✅ Audit log archival completed")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Archival error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    days = None
+    if '--days' in sys.argv[1:]:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+    success = main(days, vacuum='--vacuum' in sys.argv[1:])
+    sys.exit(0 if success else 1)
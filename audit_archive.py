@@ -0,0 +1,274 @@
+"""
+Audit-log retention: archival and compaction.
+
+Events from whole days older than AUDIT_RETENTION_DAYS are moved out of
+audit_log, one day at a time, into gzip-compressed NDJSON segments under
+AUDIT_ARCHIVE_DIR:
+
+    <AUDIT_ARCHIVE_DIR>/YYYY/MM/audit-YYYY-MM-DD.ndjson.gz
+
+Each segment is written to a temporary file, fsynced and renamed into place
+before its events are replaced, in batches, by thin AuditArchiveEntry rows
+(id, timestamp, user, action, resource). A crash in between leaves events both
+live and archived; the next run rewrites the segment and finishes the move.
+Segment records are self-contained, with the full User-Agent string.
+
+The thin rows carry the same keyset and filter indexes as audit_log, so
+search_audit_logs(include_archived=True) pages on into the archive with the
+same cursor and reads only the segments of the rows on the page. Free text
+scans segments newest first.
+
+Compaction moves the User-Agent text of legacy audit_log rows into the
+user_agents lookup table.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta, time
+
+from flask import current_app
+
+from models import (db, AuditLog, AuditArchiveEntry, UserAgent, User, user_agent_ids,
+                    adjust_stats_counters)
+from audit_search import AUDIT_PAGE_SIZE, audit_filters, before_cursor
+
+logger = logging.getLogger(__name__)
+
+# Events read, indexed and deleted per statement/commit
+ARCHIVE_BATCH_SIZE = 1000
+
+# Index rows checked per query while scanning the archive for free text
+ARCHIVE_SCAN_CHUNK = 500
+
+_INDEX_COLUMNS = ('id', 'timestamp', 'user_id', 'action', 'resource_type', 'resource_id')
+
+
+def archive_directory():
+    return current_app.config.get('AUDIT_ARCHIVE_DIR') or \
+        os.path.join(current_app.instance_path, 'audit_archive')
+
+
+def segment_path(directory, day):
+    return os.path.join(directory, f'{day:%Y}', f'{day:%m}', f'audit-{day.isoformat()}.ndjson.gz')
+
+
+def read_segment(path):
+    """{event id: record} for one day's segment; {} when there is none"""
+    records = {}
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as segment:
+            for line in segment:
+                record = json.loads(line)
+                records[record['id']] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _fsync_directory(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on this platform
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _record(row):
+    return {
+        'id': row.id,
+        'timestamp': row.timestamp.isoformat(),
+        'user_id': row.user_id,
+        'action': row.action,
+        'resource_type': row.resource_type,
+        'resource_id': row.resource_id,
+        'old_values': row.old_values,
+        'new_values': row.new_values,
+        'ip_address': row.ip_address,
+        'user_agent': row.agent or row.user_agent,
+    }
+
+
+def _archive_day(day, directory, batch_size):
+    """Write one day's events to its segment, then swap them for index rows"""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = AuditLog.__table__
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    path = segment_path(directory, day)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # Events of this day archived by an earlier (late rows) or interrupted run
+    previous = read_segment(path)
+    entries = []
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as segment:
+            query = db.select(table, UserAgent.value.label('agent'))\
+                .outerjoin(UserAgent, table.c.user_agent_id == UserAgent.id)\
+                .where(table.c.timestamp >= start, table.c.timestamp < end)\
+                .order_by(table.c.timestamp, table.c.id)
+            last = None
+            while True:
+                page = query
+                if last is not None:
+                    page = page.where(db.or_(
+                        table.c.timestamp > last.timestamp,
+                        db.and_(table.c.timestamp == last.timestamp, table.c.id > last.id)
+                    ))
+                rows = db.session.execute(page.limit(batch_size)).all()
+                if not rows:
+                    break
+                for row in rows:
+                    previous.pop(row.id, None)
+                    segment.write((json.dumps(_record(row), ensure_ascii=False) + '\n').encode('utf-8'))
+                    entries.append({column: getattr(row, column) for column in _INDEX_COLUMNS})
+                last = rows[-1]
+            for record in previous.values():
+                segment.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(temporary, path)
+    _fsync_directory(os.path.dirname(path))
+
+    for i in range(0, len(entries), batch_size):
+        batch = entries[i:i + batch_size]
+        db.session.execute(insert(AuditArchiveEntry.__table__).values(batch)
+                           .on_conflict_do_nothing(index_elements=['id']))
+        # The FTS delete trigger drops them from the free-text index
+        deleted = db.session.execute(
+            table.delete().where(table.c.id.in_([entry['id'] for entry in batch]))
+        ).rowcount
+        # Core deletes skip the flush hook that maintains the counter
+        adjust_stats_counters(db.session, {'total_audit_logs': -deleted})
+        db.session.commit()
+    return len(entries)
+
+
+def archive_audit_logs(older_than_days=None, directory=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Move events from whole days older than the retention period into the archive.
+    Returns the number of events archived. Commits per batch.
+    """
+    if older_than_days is None:
+        older_than_days = current_app.config.get('AUDIT_RETENTION_DAYS', 365)
+    directory = directory or archive_directory()
+    cutoff = datetime.combine(datetime.utcnow().date() - timedelta(days=older_than_days), time.min)
+
+    archived = 0
+    while True:
+        oldest = db.session.query(db.func.min(AuditLog.timestamp))\
+            .filter(AuditLog.timestamp < cutoff).scalar()
+        if oldest is None:
+            return archived
+        count = _archive_day(oldest.date(), directory, batch_size)
+        logger.info('Archived %d audit events from %s', count, oldest.date())
+        archived += count
+
+
+def compact_user_agents(batch_size=ARCHIVE_BATCH_SIZE):
+    """Replace the inline User-Agent text of legacy rows with user_agents references.
+    Returns the number of rows compacted. Commits per batch.
+    """
+    table = AuditLog.__table__
+    compacted = 0
+    while True:
+        rows = db.session.execute(
+            db.select(table.c.id, table.c.user_agent)
+            .where(table.c.user_agent.isnot(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return compacted
+        agents = user_agent_ids({row.user_agent for row in rows})
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('b_id'))
+            .values(user_agent=None, user_agent_id=db.bindparam('b_agent_id')),
+            [{'b_id': row.id, 'b_agent_id': agents.get(row.user_agent)} for row in rows]
+        )
+        db.session.commit()
+        compacted += len(rows)
+
+
+def vacuum_database():
+    """Return the space freed by archival to the filesystem (SQLite only)"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').exec_driver_sql('VACUUM')
+    return True
+
+
+class ArchivedAuditLog:
+    """An archived audit event, read like an AuditLog row"""
+
+    archived = True
+
+    def __init__(self, entry, record=None):
+        record = record or {}  # Index fields only if the segment is missing
+        self.id = entry.id
+        self.timestamp = entry.timestamp
+        self.user_id = entry.user_id
+        self.action = entry.action
+        self.resource_type = entry.resource_type
+        self.resource_id = entry.resource_id
+        self.old_values = record.get('old_values')
+        self.new_values = record.get('new_values')
+        self.ip_address = record.get('ip_address')
+        self.user_agent_text = record.get('user_agent')
+        self.user = None
+
+
+def _matches(record, words):
+    if record is None:
+        return False
+    text = ' '.join([
+        record['action'] or '', record['resource_type'] or '', record['resource_id'] or '',
+        json.dumps(record.get('old_values'), ensure_ascii=False),
+        json.dumps(record.get('new_values'), ensure_ascii=False),
+    ]).lower()
+    return all(word in text for word in words)
+
+
+def search_archived_audit_logs(user_id=None, action=None, resource_type=None, resource_id=None,
+                               text=None, before=None, limit=AUDIT_PAGE_SIZE, directory=None):
+    """Archived events, newest first, with the same filters and cursor as search_audit_logs"""
+    directory = directory or archive_directory()
+    query = AuditArchiveEntry.query.filter(*audit_filters(
+        AuditArchiveEntry, user_id=user_id, action=action, resource_type=resource_type,
+        resource_id=resource_id
+    )).order_by(AuditArchiveEntry.timestamp.desc(), AuditArchiveEntry.id.desc())
+    words = text.lower().split() if text else []
+
+    logs = []
+    day, records = None, {}
+    position = before
+    while len(logs) < limit:
+        page = query.filter(before_cursor(AuditArchiveEntry, position)) if position else query
+        entries = page.limit(ARCHIVE_SCAN_CHUNK if words else limit).all()
+        for entry in entries:
+            # Entries come newest first, so each segment is read once
+            if entry.timestamp.date() != day:
+                day = entry.timestamp.date()
+                records = read_segment(segment_path(directory, day))
+            record = records.get(entry.id)
+            if words and not _matches(record, words):
+                continue
+            logs.append(ArchivedAuditLog(entry, record))
+            if len(logs) == limit:
+                break
+        if not words or len(entries) < ARCHIVE_SCAN_CHUNK:
+            break
+        position = (entries[-1].timestamp, entries[-1].id)
+
+    user_ids = {log.user_id for log in logs if log.user_id is not None}
+    users = {user.id: user for user in User.query.filter(User.id.in_(user_ids))} if user_ids else {}
+    for log in logs:
+        log.user = users.get(log.user_id)
+    return logs
@@ -0,0 +1,163 @@
+"""
+Audit-log search.
+
+Filters are exact (user, resource type, resource id) or prefix (action) and
+are served by the composite indexes on AuditLog. Free text goes through an
+SQLite FTS5 index over the action, resource and old/new values, which triggers
+keep in step with every insert and delete. Without FTS5 (e.g. PostgreSQL) free
+text falls back to substring matching.
+
+Pages are keyset-paginated over (timestamp, id), newest first, so a page deep
+into the log costs the same as the first one and no COUNT(*) is run. Pages can
+continue into events moved to the archive (see audit_archive.py).
+"""
+
+import logging
+from datetime import datetime
+
+from models import db, AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_PAGE_SIZE = 50
+
+FTS_TABLE = 'audit_log_fts'
+
+_FTS_COLUMNS = ('action', 'resource_type', 'resource_id', 'old_values', 'new_values')
+
+_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"{', '.join(_FTS_COLUMNS)}, content='audit_log', content_rowid='id')",
+    f"CREATE TRIGGER audit_log_fts_insert AFTER INSERT ON audit_log BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(_FTS_COLUMNS)}) "
+    f"VALUES (new.id, {', '.join('new.' + c for c in _FTS_COLUMNS)}); END",
+    f"CREATE TRIGGER audit_log_fts_delete AFTER DELETE ON audit_log BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(_FTS_COLUMNS)}) "
+    f"VALUES ('delete', old.id, {', '.join('old.' + c for c in _FTS_COLUMNS)}); END",
+    f"CREATE TRIGGER audit_log_fts_update AFTER UPDATE ON audit_log BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {', '.join(_FTS_COLUMNS)}) "
+    f"VALUES ('delete', old.id, {', '.join('old.' + c for c in _FTS_COLUMNS)}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(_FTS_COLUMNS)}) "
+    f"VALUES (new.id, {', '.join('new.' + c for c in _FTS_COLUMNS)}); END",
+)
+
+_fts_available = None
+
+
+def install_audit_fts(engine):
+    """Create the FTS5 index and its triggers if missing, indexing existing rows.
+    Returns whether free-text search is available on this database.
+    """
+    global _fts_available
+    if engine.dialect.name != 'sqlite':
+        _fts_available = False
+        return False
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': FTS_TABLE}
+            ).first()
+            if not exists:
+                for statement in _FTS_DDL:
+                    conn.execute(db.text(statement))
+                conn.execute(db.text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except Exception:
+        logger.exception('SQLite FTS5 unavailable; audit free-text search falls back to LIKE')
+        _fts_available = False
+        return False
+    _fts_available = True
+    return True
+
+
+def _fts_enabled():
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = db.engine.dialect.name == 'sqlite' and db.session.execute(
+            db.text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': FTS_TABLE}
+        ).first() is not None
+    return _fts_available
+
+
+def _fts_query(text):
+    """Each word as a quoted FTS5 phrase, so user input never parses as query syntax"""
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def _prefix(column, prefix):
+    """column starts with prefix, as an index-friendly range"""
+    return db.and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+def parse_audit_cursor(cursor):
+    """'<timestamp iso>_<id>' -> (timestamp, id), or None when absent/invalid"""
+    try:
+        timestamp, log_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(log_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def audit_filters(model, user_id=None, action=None, resource_type=None, resource_id=None):
+    """Exact/prefix filter conditions on AuditLog or AuditArchiveEntry"""
+    conditions = []
+    if user_id is not None:
+        conditions.append(model.user_id == user_id)
+    if action:
+        conditions.append(_prefix(model.action, action.strip().upper()))
+    if resource_type:
+        conditions.append(model.resource_type == resource_type.strip())
+    if resource_id:
+        conditions.append(model.resource_id == resource_id.strip())
+    return conditions
+
+
+def before_cursor(model, before):
+    """Rows strictly after the (timestamp, id) cursor in newest-first order"""
+    timestamp, log_id = before
+    return db.or_(model.timestamp < timestamp,
+                  db.and_(model.timestamp == timestamp, model.id < log_id))
+
+
+def search_audit_logs(user_id=None, action=None, resource_type=None, resource_id=None,
+                      text=None, before=None, limit=AUDIT_PAGE_SIZE, include_archived=False):
+    """One page of audit logs, newest first, and the cursor of the next page (or None).
+
+    action matches as a case-insensitive prefix; user_id, resource_type and
+    resource_id match exactly; text is free-text over actions, resources and
+    changed values. before is a (timestamp, id) cursor. With include_archived,
+    a page continues into the archive once the live rows run out.
+    """
+    filters = dict(user_id=user_id, action=action, resource_type=resource_type, resource_id=resource_id)
+    query = AuditLog.query.options(db.joinedload(AuditLog.user))\
+        .filter(*audit_filters(AuditLog, **filters))
+    if text and text.strip():
+        if _fts_enabled():
+            matches = db.text(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :fts')\
+                .bindparams(fts=_fts_query(text)).columns(rowid=db.Integer)
+            query = query.filter(AuditLog.id.in_(matches))
+        else:
+            pattern = f'%{text.strip()}%'
+            query = query.filter(db.or_(
+                AuditLog.action.ilike(pattern), AuditLog.resource_type.ilike(pattern),
+                AuditLog.resource_id.ilike(pattern)
+            ))
+    if before:
+        query = query.filter(before_cursor(AuditLog, before))
+
+    logs = query.order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(limit + 1).all()
+    if include_archived and len(logs) <= limit:
+        from audit_archive import search_archived_audit_logs
+        # Everything archived is older than every live row
+        position = (logs[-1].timestamp, logs[-1].id) if logs else before
+        logs += search_archived_audit_logs(text=text, before=position, limit=limit + 1 - len(logs),
+                                           **filters)
+
+    next_cursor = None
+    if len(logs) > limit:
+        logs = logs[:limit]
+        last = logs[-1]
+        next_cursor = f"{last.timestamp.isoformat()}_{last.id}"
+    return logs, next_cursor
+
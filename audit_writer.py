@@ -0,0 +1,181 @@
+"""
+Asynchronous, batched audit-log writer.
+
+log_audit() used to add an AuditLog row and commit on the request thread, so
+every audited admin action paid a second commit and bulk actions took the
+SQLite write lock once per row. Events are now put on a bounded per-process
+queue and acknowledged immediately. A background thread drains the queue and
+writes up to AUDIT_BATCH_SIZE events per multi-row INSERT and commit.
+
+When the queue is full, the event is written synchronously instead (the old
+behaviour), so a backlog slows callers down rather than losing events. The
+queue is flushed at interpreter exit. Each event carries the time it was
+logged, so rows are ordered by timestamp, not by id.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class AuditWriter:
+    """Bounded event queue with a background writer committing in batches"""
+
+    def __init__(self, app, write_rows, queue_size=10000, batch_size=200, flush_interval=0.5):
+        self.app = app
+        self.write_rows = write_rows  # Inserts and commits a list of AuditLog row dicts
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()        # start-up and counters
+        self._flush_lock = threading.Lock()  # one database write at a time
+        self._queue = None
+        self._retained = []                  # events whose write failed, retried first
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+
+        self._queued = 0
+        self._written = 0
+        self._fallbacks = 0
+        self._failures = 0
+
+    def _ensure_started(self):
+        """Create the queue and start the writer in this process (first use, or after a fork)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._retained = []
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self._retained:
+                    self.flush()
+                continue
+            self.flush([first])
+
+    def _drain(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    # -- public API ------------------------------------------------------------
+
+    def submit(self, row):
+        """Queue one AuditLog row dict; False when the queue is full"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._fallbacks += 1
+            return False
+        with self._lock:
+            self._queued += 1
+        return True
+
+    def flush(self, events=None):
+        """Write retained and queued events in batches; returns the number written"""
+        if self._pid != os.getpid():
+            return 0
+        written = 0
+        with self._flush_lock:
+            events = self._retained + (events or [])
+            self._retained = []
+            while True:
+                events += self._drain(self.batch_size - len(events))
+                if not events:
+                    return written
+                try:
+                    with self.app.app_context():
+                        self.write_rows(events)
+                except Exception:
+                    logger.exception('Audit log write of %d events failed; retrying on the next cycle',
+                                     len(events))
+                    with self._lock:
+                        self._failures += 1
+                    self._retain(events)
+                    return written
+                with self._lock:
+                    self._written += len(events)
+                written += len(events)
+                events = []
+
+    def _retain(self, events):
+        """Keep failed events for the next cycle, bounded by the queue size"""
+        self._retained = events
+        overflow = len(self._retained) - self.queue_size
+        if overflow > 0:
+            logger.error('Dropping %d audit events after repeated write failures: %r',
+                         overflow, self._retained[:overflow])
+            self._retained = self._retained[overflow:]
+
+    def stop(self):
+        """Stop the writer and write everything still queued"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval * 5)
+        self.flush()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'queue_capacity': self.queue_size,
+                'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+                'retained': len(self._retained),
+                'queued': self._queued,
+                'written': self._written,
+                'sync_fallbacks': self._fallbacks,
+                'write_failures': self._failures,
+            }
+
+
+# =============================================================================
+# Module-level helpers used by the models and routes
+# =============================================================================
+
+_writer = None
+
+def init_audit_writer(app, write_rows):
+    """Route log_audit() through a background writer in this process"""
+    global _writer
+    _writer = AuditWriter(
+        app,
+        write_rows,
+        queue_size=app.config.get('AUDIT_QUEUE_SIZE', 10000),
+        batch_size=app.config.get('AUDIT_BATCH_SIZE', 200),
+        flush_interval=app.config.get('AUDIT_FLUSH_INTERVAL', 0.5)
+    )
+    atexit.register(_writer.stop)
+    return _writer
+
+def submit_audit_event(row):
+    """Queue an AuditLog row dict; False when it must be written synchronously"""
+    return _writer is not None and _writer.submit(row)
+
+def flush_audit_events():
+    """Write everything queued by this process now (e.g. before reading the log back)"""
+    if _writer is not None:
+        _writer.flush()
+
+def audit_writer_metrics():
+    return _writer.metrics() if _writer is not None else None
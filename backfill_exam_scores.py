@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Backfill the persisted score columns of submitted exam attempts
+
+Attempts submitted before the score columns existed have NULL breakdowns.
+They are scored in batches with the same set-based scoring used at submit.
+Pass --all to recompute every submitted attempt.
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import ExamAttempt, score_attempts
+
+BATCH_SIZE = 200
+
+def backfill_exam_scores(recompute_all=False):
+    """Score submitted attempts missing their breakdown (or all of them)"""
+    print("🔄 Backfilling exam attempt scores...")
+
+    with app.app_context():
+        try:
+            query = ExamAttempt.query.filter(ExamAttempt.status.in_(['completed', 'auto_submitted']))
+            if not recompute_all:
+                query = query.filter(ExamAttempt.total_score.is_(None))
+
+            total = 0
+            last_id = 0
+            while True:
+                batch = query.filter(ExamAttempt.id > last_id)\
+                             .order_by(ExamAttempt.id).limit(BATCH_SIZE).all()
+                if not batch:
+                    break
+
+                summaries = score_attempts([attempt.id for attempt in batch])
+                for attempt in batch:
+                    attempt.apply_score_summary(summaries[attempt.id])
+                db.session.commit()
+
+                last_id = batch[-1].id
+                total += len(batch)
+                print(f"   Scored {total} attempts")
+
+            print(f"✅ Backfill completed: {total} attempts scored")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Backfill error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = backfill_exam_scores(recompute_all='--all' in sys.argv[1:])
+    sys.exit(0 if success else 1)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Vectorized bulk rescoring of submitted exam attempts
+
+Each test set's answer key is packed into a NumPy array with one column per
+question. Answers of a batch of attempts are loaded as an (attempts x questions)
+matrix of option codes, so correct counts and per-part sums come out of a single
+vectorized pass. Results are written back with bulk UPDATEs.
+
+Use this after fixing answer keys (e.g. a re-run of import_test2_xlsx.py):
+
+    python bulk_scoring.py                   # every test set
+    python bulk_scoring.py --test-set "Test 2"
+"""
+
+import sys
+import os
+import time
+
+try:
+    import numpy as np  # type: ignore
+except Exception as exc:  # pragma: no cover
+    print("numpy is required. Install with: pip install numpy")
+    raise
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import (ExamAttempt, Question, Answer, LISTENING_PARTS, READING_PARTS,
+                    mark_answers_correct, refresh_stats_counters, rebuild_score_rollups,
+                    rebuild_item_stats, invalidate_cohort_stats)
+
+BATCH_SIZE = 2000
+
+SUBMITTED_STATUSES = ('completed', 'auto_submitted')
+
+# Option letters are packed as small integers; 0 means unanswered / no key
+OPTION_CODES = {'A': 1, 'B': 2, 'C': 3, 'D': 4}
+# Any other non-empty selection: answered, never correct
+OTHER_OPTION = 5
+
+
+def _option_code(column):
+    """SQL expression turning an option letter column into its packed code"""
+    letter = db.func.upper(db.func.trim(column))
+    return db.case(
+        *[(letter == option, code) for option, code in OPTION_CODES.items()],
+        (db.func.coalesce(letter, '') != '', OTHER_OPTION),
+        else_=0
+    )
+
+
+class QuestionBankKey:
+    """Packed key and part of every question in the bank, indexed by question id"""
+
+    def __init__(self):
+        rows = db.session.query(Question.id, Question.part, _option_code(Question.correct_answer),
+                                Question.test_set)\
+            .order_by(Question.question_number, Question.id).all()
+
+        size = max((row[0] for row in rows), default=0) + 1
+        self.key = np.zeros(size, dtype=np.uint8)
+        self.parts = np.zeros(size, dtype=np.int16)
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.key[ids] = [row[2] for row in rows]
+        # A key that is not A-D can never be matched
+        self.key[self.key == OTHER_OPTION] = 0
+        self.parts[ids] = [row[1] for row in rows]
+
+        # Question ids of each test set, in question-number order
+        self.test_set_ids = {}
+        for row in rows:
+            self.test_set_ids.setdefault(row[3], []).append(row[0])
+
+    def for_test_set(self, test_set):
+        return PackedAnswerKey(self, np.array(self.test_set_ids.get(test_set, []), dtype=np.int64))
+
+
+class PackedAnswerKey:
+    """Answer key of one test set: one column per question, ordered by question number"""
+
+    def __init__(self, bank, question_ids):
+        self.bank = bank
+        self.key = bank.key[question_ids]
+
+        # question id -> column, -1 for questions outside this test set
+        self.column_of = np.full(len(bank.key), -1, dtype=np.int32)
+        self.column_of[question_ids] = np.arange(len(question_ids), dtype=np.int32)
+
+        # (questions x 7) one-hot matrix summing a row of hits into parts 1-7
+        parts = bank.parts[question_ids]
+        in_range = (parts >= 1) & (parts <= 7)
+        self.part_matrix = np.zeros((len(question_ids), 7), dtype=np.int32)
+        self.part_matrix[np.nonzero(in_range)[0], parts[in_range] - 1] = 1
+
+    def __len__(self):
+        return len(self.key)
+
+
+def _load_answers(attempt_ids):
+    """(attempt_id, question_id, packed selection) rows of the given attempts as an array"""
+    rows = db.session.query(Answer.attempt_id, Answer.question_id, _option_code(Answer.selected_answer))\
+        .filter(Answer.attempt_id.in_(attempt_ids.tolist())).all()
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+
+def _score_batch(answer_key, attempt_ids):
+    """Correct counts per part and answered counts for sorted attempt_ids"""
+    answers = _load_answers(attempt_ids)
+    bank = answer_key.bank
+    # Answers to questions deleted from the bank are not scored (the SQL scorer joins on question)
+    answers = answers[answers[:, 1] < len(bank.key)]
+    rows = np.searchsorted(attempt_ids, answers[:, 0])
+    columns = answer_key.column_of[answers[:, 1]]
+    in_test_set = columns >= 0
+
+    matrix = np.zeros((len(attempt_ids), len(answer_key)), dtype=np.uint8)
+    matrix[rows[in_test_set], columns[in_test_set]] = answers[in_test_set, 2]
+
+    hits = (matrix == answer_key.key) & (answer_key.key > 0)
+    per_part = hits.astype(np.int32) @ answer_key.part_matrix
+    answered = (matrix > 0).sum(axis=1)
+
+    # Rare strays (answers to another test set's questions) are scored against the bank key
+    strays = answers[~in_test_set]
+    known = bank.parts[strays[:, 1]] > 0
+    strays, stray_rows = strays[known], rows[~in_test_set][known]
+    if len(strays):
+        stray_key = bank.key[strays[:, 1]]
+        stray_hits = (strays[:, 2] == stray_key) & (stray_key > 0)
+        stray_parts = bank.parts[strays[:, 1]].astype(np.int64)
+        in_range = (stray_parts >= 1) & (stray_parts <= 7)
+        np.add.at(per_part, (stray_rows[in_range], stray_parts[in_range] - 1),
+                  stray_hits[in_range].astype(np.int32))
+        np.add.at(answered, stray_rows, (strays[:, 2] > 0).astype(answered.dtype))
+
+    return per_part, answered
+
+
+def _score_rows(attempt_ids, per_part, answered):
+    """Bulk UPDATE parameter rows for one scored batch"""
+    correct = per_part.sum(axis=1)
+    listening = per_part[:, [part - 1 for part in LISTENING_PARTS]].sum(axis=1)
+    reading = per_part[:, [part - 1 for part in READING_PARTS]].sum(axis=1)
+    # Same linear scale as scaled_section_score(); rint rounds half to even like round()
+    listening_score = np.rint(listening * 4.95).astype(np.int64)
+    reading_score = np.rint(reading * 4.95).astype(np.int64)
+
+    columns = {
+        'answered_count': answered,
+        'correct_answers': correct,
+        'score': correct,
+        'listening_correct': listening,
+        'reading_correct': reading,
+        'listening_score': listening_score,
+        'reading_score': reading_score,
+        'total_score': listening_score + reading_score,
+    }
+    for part in range(1, 8):
+        columns[f'part{part}_correct'] = per_part[:, part - 1]
+
+    values = {name: array.tolist() for name, array in columns.items()}
+    return [
+        dict({'id': attempt_id}, **{name: column[i] for name, column in values.items()})
+        for i, attempt_id in enumerate(attempt_ids.tolist())
+    ]
+
+
+def rescore_test_set(bank, test_set, batch_size=BATCH_SIZE):
+    """Rescore every submitted attempt of one test set; returns the number of attempts"""
+    answer_key = bank.for_test_set(test_set)
+    total = 0
+    last_id = 0
+    while True:
+        attempt_ids = np.array([
+            row[0] for row in db.session.query(ExamAttempt.id)
+            .filter(ExamAttempt.test_set == test_set,
+                    ExamAttempt.status.in_(SUBMITTED_STATUSES),
+                    ExamAttempt.id > last_id)
+            .order_by(ExamAttempt.id).limit(batch_size).all()
+        ], dtype=np.int64)
+        if not len(attempt_ids):
+            break
+
+        per_part, answered = _score_batch(answer_key, attempt_ids)
+        db.session.execute(db.update(ExamAttempt), _score_rows(attempt_ids, per_part, answered))
+        mark_answers_correct(attempt_ids.tolist())
+        db.session.commit()
+
+        last_id = int(attempt_ids[-1])
+        total += len(attempt_ids)
+    return total
+
+
+def rescore_attempts(test_sets=None):
+    """Rescore submitted attempts of the given test sets (default: all)"""
+    print("🔄 Rescoring submitted exam attempts...")
+
+    with app.app_context():
+        try:
+            if test_sets is None:
+                test_sets = [row[0] for row in db.session.query(ExamAttempt.test_set)
+                             .filter(ExamAttempt.status.in_(SUBMITTED_STATUSES),
+                                     ExamAttempt.test_set.isnot(None))
+                             .distinct().all()]
+
+            bank = QuestionBankKey()
+            for test_set in test_sets:
+                started = time.monotonic()
+                count = rescore_test_set(bank, test_set)
+                print(f"   {test_set}: {count} attempts in {time.monotonic() - started:.1f}s")
+
+            # Bulk UPDATEs bypass the incremental dashboard counters, rollups, item and cohort stats
+            refresh_stats_counters(['score_sum'])
+            rebuild_score_rollups()
+            rebuild_item_stats()
+            invalidate_cohort_stats()
+            db.session.commit()
+
+            print("✅ Rescoring completed")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Rescoring error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    selected = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == '--test-set'] or None
+    success = rescore_attempts(selected)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,166 @@
+"""
+Cohort reports across the Year -> Program -> Group hierarchy.
+
+A cohort is the set of students with an active membership in a group, or in
+any group of a program or year; its figures cover all of their attempts.
+Members, attempts, completions, the average total score and its distribution
+come from one aggregate join through UserGroup per hierarchy level.
+
+Results are cached per node in cohort_stats. Flushes that change a membership,
+move a group or program, or start, complete or rescore an attempt mark only the
+affected groups and their ancestors stale (see models._invalidate_cohort_stats);
+stale nodes are recomputed here on read. Loading the whole organization tree
+with its statistics takes a constant number of queries.
+"""
+
+from datetime import datetime
+
+from models import (db, Year, Program, Group, UserGroup, ExamAttempt, CohortStat,
+                    SCORE_BUCKETS)
+
+NODE_TYPES = ('year', 'program', 'group')
+
+# Summable CohortStat columns
+_COHORT_VALUES = ('members', 'attempts', 'completions', 'scored', 'score_sum') \
+    + tuple(column for column, _, _ in SCORE_BUCKETS)
+
+# Node ids refreshed per aggregate query
+_REFRESH_CHUNK = 500
+
+
+def load_organization_tree(include_inactive=False):
+    """Years with their programs and groups, eagerly loaded in three queries"""
+    query = Year.query.options(db.selectinload(Year.programs).selectinload(Program.groups))
+    if not include_inactive:
+        query = query.filter_by(is_active=True)
+    return query.order_by(Year.name).all()
+
+
+def _node_column(node_type):
+    return {'year': Program.year_id, 'program': Group.program_id, 'group': Group.id}[node_type]
+
+
+def _compute(node_type, node_ids):
+    """{node_id: {column: value}} for the given nodes from one aggregate query"""
+    node = _node_column(node_type)
+    members = db.session.query(node.label('node_id'), UserGroup.user_id.label('user_id'))\
+        .select_from(UserGroup).join(Group, UserGroup.group_id == Group.id)
+    if node_type == 'year':
+        members = members.join(Program, Group.program_id == Program.id)
+    # A student in several groups of one program or year counts once
+    members = members.filter(UserGroup.is_active == True, node.in_(node_ids)).distinct().subquery()
+
+    completed = ExamAttempt.is_completed == True
+    scored = db.and_(completed, ExamAttempt.total_score.isnot(None))
+    buckets = []
+    for index, (_, lowest, highest) in enumerate(SCORE_BUCKETS):
+        condition = ExamAttempt.total_score >= lowest
+        if index < len(SCORE_BUCKETS) - 1:
+            condition = db.and_(condition, ExamAttempt.total_score <= highest)
+        buckets.append(db.func.sum(db.case((db.and_(scored, condition), 1), else_=0)))
+
+    rows = db.session.query(
+        members.c.node_id,
+        db.func.count(db.distinct(members.c.user_id)),
+        db.func.count(ExamAttempt.id),
+        db.func.sum(db.case((completed, 1), else_=0)),
+        db.func.sum(db.case((scored, 1), else_=0)),
+        db.func.sum(db.case((scored, ExamAttempt.total_score), else_=0)),
+        *buckets
+    ).outerjoin(ExamAttempt, ExamAttempt.user_id == members.c.user_id)\
+        .group_by(members.c.node_id).all()
+
+    results = {node_id: dict.fromkeys(_COHORT_VALUES, 0) for node_id in node_ids}
+    for node_id, *values in rows:
+        results[node_id] = dict(zip(_COHORT_VALUES, (int(value or 0) for value in values)))
+    return results
+
+
+def _store(node_type, computed, versions):
+    """Save recomputed nodes. A row invalidated meanwhile (version moved on) stays stale."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = CohortStat.__table__
+    now = datetime.utcnow()
+    existing = [
+        dict({f'b_{column}': value for column, value in values.items()},
+             b_node_id=node_id, b_version=versions[node_id])
+        for node_id, values in computed.items() if node_id in versions
+    ]
+    if existing:
+        db.session.execute(
+            table.update().where(
+                table.c.node_type == node_type,
+                table.c.node_id == db.bindparam('b_node_id'),
+                table.c.version == db.bindparam('b_version')
+            ).values(is_stale=False, computed_at=now,
+                     **{column: db.bindparam(f'b_{column}') for column in _COHORT_VALUES}),
+            existing
+        )
+    missing = [
+        dict(values, node_type=node_type, node_id=node_id, is_stale=False, version=0, computed_at=now)
+        for node_id, values in computed.items() if node_id not in versions
+    ]
+    if missing:
+        db.session.execute(insert(table).values(missing).on_conflict_do_nothing(
+            index_elements=['node_type', 'node_id']
+        ))
+
+
+def _summarize(values):
+    scored = values['scored']
+    attempts = values['attempts']
+    return {
+        'members': values['members'],
+        'attempts': attempts,
+        'completions': values['completions'],
+        'completion_rate': round(values['completions'] * 100 / attempts, 1) if attempts else None,
+        'avg_score': round(values['score_sum'] / scored, 1) if scored else None,
+        'distribution': {
+            f'{lowest}-{highest}': values[column] for column, lowest, highest in SCORE_BUCKETS
+        },
+    }
+
+
+def get_cohort_stats(years):
+    """{(node_type, node_id): summary} for every year, program and group in the tree.
+
+    Fresh nodes come from the cache in one query; stale or missing ones are
+    recomputed with one aggregate query per hierarchy level and written back.
+    The caller commits.
+    """
+    node_ids = {
+        'year': [year.id for year in years],
+        'program': [program.id for year in years for program in year.programs],
+        'group': [group.id for year in years for program in year.programs for group in program.groups],
+    }
+    conditions = [
+        db.and_(CohortStat.node_type == node_type, CohortStat.node_id.in_(ids))
+        for node_type, ids in node_ids.items() if ids
+    ]
+    if not conditions:
+        return {}
+
+    cached = {(row.node_type, row.node_id): row for row in CohortStat.query.filter(db.or_(*conditions))}
+    stats = {}
+    for node_type in NODE_TYPES:
+        versions = {}
+        stale = []
+        for node_id in node_ids[node_type]:
+            row = cached.get((node_type, node_id))
+            if row is not None:
+                versions[node_id] = row.version
+            if row is None or row.is_stale:
+                stale.append(node_id)
+            else:
+                stats[(node_type, node_id)] = {column: getattr(row, column) for column in _COHORT_VALUES}
+
+        for i in range(0, len(stale), _REFRESH_CHUNK):
+            computed = _compute(node_type, stale[i:i + _REFRESH_CHUNK])
+            _store(node_type, computed, versions)
+            stats.update(((node_type, node_id), values) for node_id, values in computed.items())
+
+    return {key: _summarize(values) for key, values in stats.items()}
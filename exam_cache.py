@@ -0,0 +1,138 @@
+"""
+In-process, read-only snapshots of the question bank.
+
+Each worker keeps one TestSetSnapshot per test set. Snapshots are stamped with
+the shared "question_bank" cache version; anything that changes questions calls
+invalidate_question_bank() so every worker rebuilds on its next version check.
+"""
+
+import threading
+import time
+from types import MappingProxyType
+from typing import NamedTuple, Optional
+
+from models import db, Question, get_cache_version, bump_cache_version
+
+QUESTION_BANK_CACHE = 'question_bank'
+
+# How often (seconds) a worker re-reads the shared version stamp
+VERSION_CHECK_INTERVAL = 5
+
+# Question-number ranges of each part as laid out on the exam page
+EXAM_PART_RANGES = {
+    1: (1, 10),
+    2: (11, 40),
+    3: (41, 70),
+    4: (71, 100),
+    5: (101, 140),
+    6: (141, 152),
+    7: (153, 200),
+}
+
+
+def exam_part_for(question_number):
+    """Part a question number belongs to on the exam page, or None"""
+    for part, (start, end) in EXAM_PART_RANGES.items():
+        if start <= question_number <= end:
+            return part
+    return None
+
+
+class QuestionRecord(NamedTuple):
+    """Lightweight, immutable copy of a Question row"""
+    id: int
+    part: int
+    question_number: int
+    question_text: str
+    option_a: Optional[str]
+    option_b: Optional[str]
+    option_c: Optional[str]
+    option_d: Optional[str]
+    audio_file: Optional[str]
+    image_file: Optional[str]
+    test_set: Optional[str]
+
+
+# Columns selected when building a snapshot, in QuestionRecord field order
+_RECORD_COLUMNS = [getattr(Question, field) for field in QuestionRecord._fields]
+
+
+class TestSetSnapshot:
+    """Read-only view of one test set with questions grouped by part"""
+    __slots__ = ('test_set', 'version', 'questions', 'parts', 'question_ids')
+
+    def __init__(self, test_set, version, questions):
+        self.test_set = test_set
+        self.version = version
+        self.questions = tuple(questions)
+
+        grouped = {}
+        for question in self.questions:
+            grouped.setdefault(question.part, []).append(question)
+        self.parts = MappingProxyType({part: tuple(qs) for part, qs in grouped.items()})
+
+        # question_number -> id; a question in the part the number is shown under wins
+        question_ids = {}
+        for question in self.questions:
+            if exam_part_for(question.question_number) == question.part:
+                question_ids.setdefault(question.question_number, question.id)
+        for question in self.questions:
+            question_ids.setdefault(question.question_number, question.id)
+        self.question_ids = MappingProxyType(question_ids)
+
+    def part(self, part_number):
+        """Questions of one part, ordered by question number"""
+        return self.parts.get(part_number, ())
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def __len__(self):
+        return len(self.questions)
+
+
+_snapshots = {}
+_lock = threading.Lock()
+_known_version = None
+_checked_at = 0.0
+
+
+def _current_version():
+    """Shared question bank version, re-read at most every VERSION_CHECK_INTERVAL"""
+    global _known_version, _checked_at
+    now = time.monotonic()
+    if _known_version is None or now - _checked_at >= VERSION_CHECK_INTERVAL:
+        _known_version = get_cache_version(QUESTION_BANK_CACHE)
+        _checked_at = now
+    return _known_version
+
+
+def _build_snapshot(test_set, version):
+    rows = db.session.query(*_RECORD_COLUMNS)\
+        .filter(Question.test_set == test_set)\
+        .order_by(Question.part, Question.question_number).all()
+    return TestSetSnapshot(test_set, version, [QuestionRecord._make(row) for row in rows])
+
+
+def get_test_set_snapshot(test_set):
+    """Return the cached snapshot for a test set, rebuilding it if stale"""
+    version = _current_version()
+    snapshot = _snapshots.get(test_set)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    with _lock:
+        snapshot = _snapshots.get(test_set)
+        if snapshot is None or snapshot.version != version:
+            snapshot = _build_snapshot(test_set, version)
+            _snapshots[test_set] = snapshot
+    return snapshot
+
+
+def invalidate_question_bank():
+    """Bump the shared question bank version and drop local snapshots. The caller commits."""
+    global _known_version
+    bump_cache_version(QUESTION_BANK_CACHE)
+    with _lock:
+        _snapshots.clear()
+        _known_version = None
@@ -0,0 +1,160 @@
+"""
+Server-sent events for in-progress exams.
+
+Each worker keeps an in-process broker of per-attempt subscriber queues. Routes
+publish deltas (answers saved from another tab, deadline changes, submission)
+and /exam/<attempt_id>/events streams them at once when they happen in the
+stream's own worker. Every RECONCILE_INTERVAL seconds a stream also re-reads
+the attempt's status, deadline and state_version, and sends the answers changed
+since the last version it saw, so changes made through other workers arrive
+within that interval without any client polling.
+
+Each open stream holds a worker thread, so the app runs with a threaded
+worker class (gunicorn --worker-class gthread, see .replit).
+"""
+
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from models import db, ExamAttempt, Answer, Question
+from utils import exam_deadline
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Seconds between single-row status/deadline checks per stream
+RECONCILE_INTERVAL = 30
+
+# Events buffered per subscriber before new ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ExamEventBroker:
+    """Fan-out of exam events to the streams subscribed to an attempt"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, attempt_id):
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(attempt_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, attempt_id, q):
+        with self._lock:
+            subscribers = self._subscribers.get(attempt_id)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._subscribers[attempt_id]
+
+    def publish(self, attempt_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(attempt_id, ()))
+        for q in subscribers:
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                # A stalled client; it catches up from the next reconcile
+                pass
+
+
+broker = ExamEventBroker()
+
+
+def format_event(event, data):
+    """Encode one SSE message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def deadline_payload(start_time, extended_seconds, status):
+    """Deadline event body; time_remaining lets clients ignore their own clock skew"""
+    deadline = exam_deadline(start_time, extended_seconds)
+    remaining = 0
+    if status == 'in_progress':
+        remaining = max(0, int((deadline - datetime.utcnow()).total_seconds()))
+    return {'deadline': deadline.isoformat() + 'Z', 'time_remaining': remaining}
+
+
+def publish_answers(attempt_id, answers, origin=None):
+    """Answers saved for an attempt, keyed by question number"""
+    if answers:
+        broker.publish(attempt_id, 'answers', {'answers': answers, 'origin': origin})
+
+
+def publish_deadline(attempt):
+    broker.publish(attempt.id, 'deadline',
+                   deadline_payload(attempt.start_time, attempt.extended_seconds, attempt.status))
+
+
+def publish_submitted(attempt):
+    broker.publish(attempt.id, 'submitted', {'status': attempt.status})
+
+
+def _reconcile(attempt_id, since):
+    """The attempt's status, timing and state_version from one indexed single-row read,
+    plus the answers changed after version `since` (keyed by question number) when
+    the version moved on
+    """
+    row = db.session.query(
+        ExamAttempt.status, ExamAttempt.start_time, ExamAttempt.extended_seconds,
+        ExamAttempt.state_version
+    ).filter(ExamAttempt.id == attempt_id).one()
+    version = row.state_version or 0
+    answers = {}
+    if version > since:
+        answers = dict(
+            db.session.query(Question.question_number, Answer.selected_answer)
+            .join(Question, Answer.question_id == Question.id)
+            .filter(Answer.attempt_id == attempt_id, Answer.version > since)
+        )
+    # Give the connection back to the pool while the stream idles
+    db.session.close()
+    return row.status, row.start_time, row.extended_seconds, version, answers
+
+
+def event_stream(attempt):
+    """Generator yielding the SSE stream for an attempt"""
+    attempt_id = attempt.id
+    status, start_time, extended = attempt.status, attempt.start_time, attempt.extended_seconds
+    version = attempt.state_version or 0
+    db.session.close()
+
+    q = broker.subscribe(attempt_id)
+    try:
+        yield "retry: 5000\n\n"
+        yield format_event('deadline', deadline_payload(start_time, extended, status))
+        if status != 'in_progress':
+            yield format_event('submitted', {'status': status})
+            return
+
+        last_reconcile = time.monotonic()
+        while True:
+            timeout = min(HEARTBEAT_INTERVAL, max(0, RECONCILE_INTERVAL - (time.monotonic() - last_reconcile)))
+            try:
+                event, data = q.get(timeout=timeout)
+                yield format_event(event, data)
+                if event == 'submitted':
+                    return
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+
+            if time.monotonic() - last_reconcile >= RECONCILE_INTERVAL:
+                last_reconcile = time.monotonic()
+                new_status, new_start, new_extended, version, answers = _reconcile(attempt_id, version)
+                if answers:
+                    # Saved through any worker; the page ignores ones it has pending
+                    yield format_event('answers', {'answers': answers, 'origin': None})
+                if new_status != 'in_progress':
+                    yield format_event('submitted', {'status': new_status})
+                    return
+                if (new_start, new_extended) != (start_time, extended):
+                    start_time, extended = new_start, new_extended
+                    yield format_event('deadline', deadline_payload(start_time, extended, new_status))
+    finally:
+        broker.unsubscribe(attempt_id, q)
@@ -0,0 +1,111 @@
+"""
+Auto-submission of expired exam attempts.
+
+Attempts whose deadline (start_time + EXAM_DURATION_SECONDS + extension) has
+passed by more than SWEEP_GRACE_SECONDS are scored in batches with the
+set-based scorer and marked 'auto_submitted'. The grace period leaves room for
+the client's own auto-submit to land first. Each batch is claimed with a
+conditional UPDATE before scoring, so concurrent sweeps (one per worker, or
+cron alongside) and a late submit never score the same attempt twice.
+
+Runs in-process when EXAM_SWEEP_INTERVAL is set (see app.py), or from the
+command line / cron:
+
+    python exam_sweeper.py
+"""
+
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from answer_journal import flush_attempts_answers
+from exam_events import publish_submitted
+from models import db, ExamAttempt, score_attempts, bump_state_version, claim_attempts
+from utils import EXAM_DURATION_SECONDS, exam_deadline
+
+logger = logging.getLogger(__name__)
+
+# Seconds past the deadline before the server submits on the student's behalf
+SWEEP_GRACE_SECONDS = 60
+
+# Attempts scored per transaction
+SWEEP_BATCH_SIZE = 200
+
+
+def sweep_expired_attempts(batch_size=SWEEP_BATCH_SIZE, grace_seconds=SWEEP_GRACE_SECONDS):
+    """Auto-submit every expired in-progress attempt; returns the number submitted.
+    Runs inside an app context and commits after each batch.
+    """
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=grace_seconds)
+    # Extensions only ever add time, so this bound never misses an expired attempt
+    started_before = cutoff - timedelta(seconds=EXAM_DURATION_SECONDS)
+
+    submitted = 0
+    last_id = 0
+    while True:
+        candidates = ExamAttempt.query.filter(
+            ExamAttempt.status == 'in_progress',
+            ExamAttempt.start_time <= started_before,
+            ExamAttempt.id > last_id
+        ).order_by(ExamAttempt.id).limit(batch_size).all()
+        if not candidates:
+            return submitted
+        last_id = candidates[-1].id
+
+        expired = [
+            attempt for attempt in candidates
+            if exam_deadline(attempt.start_time, attempt.extended_seconds) <= cutoff
+        ]
+        if not expired:
+            continue
+
+        # Another worker's sweep or a late submit may have taken some of them already
+        claimed = set(claim_attempts([attempt.id for attempt in expired], 'auto_submitted'))
+        expired = [attempt for attempt in expired if attempt.id in claimed]
+        if not expired:
+            db.session.commit()
+            continue
+
+        # Pull in answers still waiting in the write-behind journal before scoring
+        flush_attempts_answers([attempt.id for attempt in expired])
+
+        summaries = score_attempts([attempt.id for attempt in expired])
+        for attempt in expired:
+            attempt.apply_score_summary(summaries[attempt.id])
+            attempt.is_completed = True
+            attempt.status = 'auto_submitted'
+            attempt.end_time = exam_deadline(attempt.start_time, attempt.extended_seconds)
+            bump_state_version(attempt.id)
+        db.session.commit()
+
+        for attempt in expired:
+            publish_submitted(attempt)
+        submitted += len(expired)
+        logger.info('Auto-submitted %d expired attempts', len(expired))
+
+
+def start_exam_sweeper(app, interval):
+    """Run sweep_expired_attempts every `interval` seconds in a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    sweep_expired_attempts()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Exam sweep failed; retrying on the next cycle')
+
+    thread = threading.Thread(target=run, name='exam-sweeper', daemon=True)
+    thread.start()
+    return stop
+
+
+if __name__ == '__main__':
+    from main import app
+
+    with app.app_context():
+        count = sweep_expired_attempts()
+    print(f"✅ Auto-submitted {count} expired attempts")
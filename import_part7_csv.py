@@ -3,7 +3,8 @@ import sys
 import os
 
 from app import app
-from models import db, Question
+from models import db, Question, process_rescore_queue
+from exam_cache import invalidate_question_bank
 
 
 def upsert_part7(csv_path: str, test_set: str = 'LC Test 1') -> None:
@@ -86,7 +87,10 @@ def upsert_part7(csv_path: str, test_set: str = 'LC Test 1') -> None:
 
                 db.session.add(q)
 
+        invalidate_question_bank()
         db.session.commit()
+        # Adjust scores of attempts that answered questions whose key changed
+        process_rescore_queue()
         print(f"Upsert complete. Created: {created}, Updated: {updated}")
 
 
@@ -8,7 +8,8 @@ except Exception as exc:  # pragma: no cover
     raise
 
 from app import app
-from models import db, Question
+from models import db, Question, process_rescore_queue
+from exam_cache import invalidate_question_bank
 
 
 def resolve_header(headers: list[str], *aliases: str) -> Optional[str]:
@@ -123,7 +124,10 @@ def import_test2_from_xlsx(xlsx_path: str, sheet_name: str = "Test 2 questions",
                     else:
                         q.image_file = norm
 
+        invalidate_question_bank()
         db.session.commit()
+        # Adjust scores of attempts that answered questions whose key changed
+        process_rescore_queue()
         print(f"Upsert complete for {test_set}. Created: {created}, Updated: {updated}")
 
 
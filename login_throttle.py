@@ -0,0 +1,173 @@
+"""
+Sliding-window throttling of failed logins.
+
+Failed attempts are counted per email and per client IP over a sliding
+window. Once a key reaches its limit, further attempts are rejected before any
+database query or password hash is run. A credential-stuffing burst then costs
+a dictionary lookup per request.
+
+The default store is a fixed-size LRU in process memory, so each worker
+enforces its own limits. Set LOGIN_THROTTLE_BACKEND=sqlite to share counters
+between the workers of one host through a small SQLite file.
+
+Per-IP limits are deliberately generous: a whole classroom often signs in from
+one address just before a proctored session.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+# (max failures, window seconds) per key kind
+DEFAULT_EMAIL_LIMIT = (5, 300)
+DEFAULT_IP_LIMIT = (50, 300)
+
+# Keys tracked by the in-memory store before the least recently used are evicted
+DEFAULT_MAX_KEYS = 10000
+
+
+class MemoryThrottleStore:
+    """Failure timestamps per key in a bounded LRU; per process"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def window(self, key, since):
+        """(failures since `since`, oldest of them or None)"""
+        with self._lock:
+            stamps = self._entries.get(key)
+            if not stamps:
+                return 0, None
+            while stamps and stamps[0] < since:
+                stamps.popleft()
+            if not stamps:
+                del self._entries[key]
+                return 0, None
+            return len(stamps), stamps[0]
+
+    def add(self, key, now, limit):
+        with self._lock:
+            stamps = self._entries.get(key)
+            if stamps is None:
+                # Only the newest `limit` stamps matter for the decision
+                stamps = self._entries[key] = deque(maxlen=limit)
+            else:
+                self._entries.move_to_end(key)
+            stamps.append(now)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def clear(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SqliteThrottleStore:
+    """Failure timestamps in a SQLite file shared by the workers of one host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute('CREATE TABLE IF NOT EXISTS login_failure (key TEXT NOT NULL, ts REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_login_failure_key_ts ON login_failure (key, ts)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def window(self, key, since):
+        conn = self._connection()
+        conn.execute('DELETE FROM login_failure WHERE key = ? AND ts < ?', (key, since))
+        count, oldest = conn.execute(
+            'SELECT COUNT(*), MIN(ts) FROM login_failure WHERE key = ?', (key,)
+        ).fetchone()
+        return count, oldest
+
+    def add(self, key, now, limit):
+        self._connection().execute('INSERT INTO login_failure (key, ts) VALUES (?, ?)', (key, now))
+
+    def clear(self, key):
+        self._connection().execute('DELETE FROM login_failure WHERE key = ?', (key,))
+
+
+class LoginThrottle:
+    """Sliding-window limits on failed logins per email and per client IP"""
+
+    def __init__(self, store, email_limit=DEFAULT_EMAIL_LIMIT, ip_limit=DEFAULT_IP_LIMIT):
+        self.store = store
+        self.rules = {'email': email_limit, 'ip': ip_limit}
+
+    @staticmethod
+    def _keys(email, ip):
+        keys = []
+        if email:
+            keys.append(('email', 'email:' + email.strip().lower()))
+        if ip:
+            keys.append(('ip', 'ip:' + ip))
+        return keys
+
+    def retry_after(self, email, ip):
+        """0 if an attempt is allowed, otherwise seconds until it will be"""
+        now = time.time()
+        wait = 0
+        for kind, key in self._keys(email, ip):
+            limit, window = self.rules[kind]
+            count, oldest = self.store.window(key, now - window)
+            if count >= limit:
+                wait = max(wait, int(oldest + window - now) + 1)
+        return wait
+
+    def record_failure(self, email, ip):
+        now = time.time()
+        for kind, key in self._keys(email, ip):
+            self.store.add(key, now, self.rules[kind][0])
+
+    def reset(self, email):
+        """Forget an account's failures after a successful login"""
+        for _, key in self._keys(email, None):
+            self.store.clear(key)
+
+
+# =============================================================================
+# Module-level helpers used by the routes
+# =============================================================================
+
+_throttle = None
+
+def init_login_throttle(app):
+    """Create this process's login throttle from the app config"""
+    global _throttle
+    if app.config.get('LOGIN_THROTTLE_BACKEND') == 'sqlite':
+        path = app.config.get('LOGIN_THROTTLE_DB') or os.path.join(app.instance_path, 'login_throttle.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        store = SqliteThrottleStore(path)
+    else:
+        store = MemoryThrottleStore(app.config.get('LOGIN_THROTTLE_MAX_KEYS', DEFAULT_MAX_KEYS))
+    _throttle = LoginThrottle(
+        store,
+        email_limit=app.config.get('LOGIN_THROTTLE_EMAIL_LIMIT', DEFAULT_EMAIL_LIMIT),
+        ip_limit=app.config.get('LOGIN_THROTTLE_IP_LIMIT', DEFAULT_IP_LIMIT)
+    )
+    return _throttle
+
+def login_retry_after(email, ip):
+    return _throttle.retry_after(email, ip) if _throttle is not None else 0
+
+def record_login_failure(email, ip):
+    if _throttle is not None:
+        _throttle.record_failure(email, ip)
+
+def reset_login_failures(email):
+    if _throttle is not None:
+        _throttle.reset(email)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Migration script to add new fields and the unique (attempt_id, question_id)
+index to the Answer table
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+
+def migrate_answer_table():
+    """Add new fields, remove duplicate answers and add the unique index"""
+    print("🔄 Migrating Answer table...")
+
+    with app.app_context():
+        try:
+            inspector = db.inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('answer')]
+            indexes = [ix['name'] for ix in inspector.get_indexes('answer')]
+
+            new_columns = [
+                ('version', 'INTEGER DEFAULT 0')
+            ]
+
+            for column_name, column_type in new_columns:
+                if column_name not in columns:
+                    print(f"   Adding column: {column_name}")
+                    with db.engine.connect() as conn:
+                        conn.execute(db.text(f'ALTER TABLE answer ADD COLUMN {column_name} {column_type}'))
+                        conn.commit()
+                else:
+                    print(f"   Column {column_name} already exists")
+
+            if 'ix_answer_attempt_question' not in indexes:
+                with db.engine.connect() as conn:
+                    # Keep the most recent row for each attempt/question pair
+                    result = conn.execute(db.text(
+                        "DELETE FROM answer WHERE id NOT IN ("
+                        "SELECT MAX(id) FROM answer GROUP BY attempt_id, question_id)"
+                    ))
+                    print(f"   Removed {result.rowcount} duplicate answers")
+
+                    print("   Adding index: ix_answer_attempt_question")
+                    conn.execute(db.text(
+                        'CREATE UNIQUE INDEX ix_answer_attempt_question ON answer (attempt_id, question_id)'
+                    ))
+                    conn.commit()
+            else:
+                print("   Index ix_answer_attempt_question already exists")
+
+            # Set default values for existing answers
+            with db.engine.connect() as conn:
+                conn.execute(db.text('UPDATE answer SET version = 0 WHERE version IS NULL'))
+                conn.commit()
+
+            print("✅ Answer table migration completed")
+            return True
+
+        except Exception as e:
+            print(f"❌ Migration error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = migrate_answer_table()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Migration script to add the search indexes and the user_agent_id column to the AuditLog table
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from audit_search import install_audit_fts
+
+def migrate_audit_log_table():
+    """Add the keyset/filter indexes and the free-text index to an existing audit_log table"""
+    print("🔄 Migrating AuditLog table to add search indexes...")
+    
+    with app.app_context():
+        try:
+            # user_agents and audit_log_archive are new tables
+            db.create_all()
+            inspector = db.inspect(db.engine)
+            columns = [col['name'] for col in inspector.get_columns('audit_log')]
+            if 'user_agent_id' not in columns:
+                print("   Adding column: user_agent_id")
+                with db.engine.connect() as conn:
+                    conn.execute(db.text('ALTER TABLE audit_log ADD COLUMN user_agent_id INTEGER REFERENCES user_agents (id)'))
+                    conn.commit()
+            else:
+                print("   Column user_agent_id already exists")
+            
+            indexes = [ix['name'] for ix in inspector.get_indexes('audit_log')]
+            new_indexes = [
+                ('ix_audit_log_timestamp', 'timestamp, id'),
+                ('ix_audit_log_user_timestamp', 'user_id, timestamp, id'),
+                ('ix_audit_log_action_timestamp', 'action, timestamp, id'),
+                ('ix_audit_log_resource', 'resource_type, resource_id')
+            ]
+            
+            for index_name, index_columns in new_indexes:
+                if index_name not in indexes:
+                    print(f"   Adding index: {index_name}")
+                    with db.engine.connect() as conn:
+                        conn.execute(db.text(f'CREATE INDEX {index_name} ON audit_log ({index_columns})'))
+                        conn.commit()
+                else:
+                    print(f"   Index {index_name} already exists")
+            
+            if install_audit_fts(db.engine):
+                print("   Free-text index audit_log_fts is in place")
+            else:
+                print("   Free-text index unavailable (needs SQLite FTS5); text search uses LIKE")
+            
+            print("✅ AuditLog table migration completed")
+            return True
+            
+        except Exception as e:
+            print(f"❌ Migration error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = migrate_audit_log_table()
+    sys.exit(0 if success else 1)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Migration script to add test_set field to ExamAttempt table
+Migration script to add new fields to the ExamAttempt table
 """
 
 import sys
@@ -14,29 +14,67 @@ from main import app, db
 from models import ExamAttempt
 
 def migrate_exam_attempt_table():
-    """Add test_set field to existing ExamAttempt table"""
-    print("🔄 Migrating ExamAttempt table to add test_set field...")
+    """Add new fields to existing ExamAttempt table"""
+    print("🔄 Migrating ExamAttempt table to add new fields...")
     
     with app.app_context():
         try:
-            # Check if column already exists
+            # Check if columns already exist
             inspector = db.inspect(db.engine)
             columns = [col['name'] for col in inspector.get_columns('exam_attempt')]
             
-            if 'test_set' not in columns:
-                print("   Adding column: test_set")
-                with db.engine.connect() as conn:
-                    conn.execute(db.text('ALTER TABLE exam_attempt ADD COLUMN test_set VARCHAR(50)'))
-                    conn.commit()
-            else:
-                print("   Column test_set already exists")
+            new_columns = [
+                ('test_set', 'VARCHAR(50)'),
+                ('extended_seconds', 'INTEGER DEFAULT 0'),
+                ('state_version', 'INTEGER DEFAULT 0'),
+                ('answered_count', 'INTEGER'),
+                ('part1_correct', 'INTEGER'),
+                ('part2_correct', 'INTEGER'),
+                ('part3_correct', 'INTEGER'),
+                ('part4_correct', 'INTEGER'),
+                ('part5_correct', 'INTEGER'),
+                ('part6_correct', 'INTEGER'),
+                ('part7_correct', 'INTEGER'),
+                ('listening_correct', 'INTEGER'),
+                ('reading_correct', 'INTEGER'),
+                ('listening_score', 'INTEGER'),
+                ('reading_score', 'INTEGER'),
+                ('total_score', 'INTEGER')
+            ]
+            
+            for column_name, column_type in new_columns:
+                if column_name not in columns:
+                    print(f"   Adding column: {column_name}")
+                    with db.engine.connect() as conn:
+                        conn.execute(db.text(f'ALTER TABLE exam_attempt ADD COLUMN {column_name} {column_type}'))
+                        conn.commit()
+                else:
+                    print(f"   Column {column_name} already exists")
+            
+            indexes = [ix['name'] for ix in inspector.get_indexes('exam_attempt')]
+            new_indexes = [
+                ('ix_exam_attempt_status_start', 'status, start_time'),
+                ('ix_exam_attempt_user_end', 'user_id, end_time, id')
+            ]
+            
+            for index_name, index_columns in new_indexes:
+                if index_name not in indexes:
+                    print(f"   Adding index: {index_name}")
+                    with db.engine.connect() as conn:
+                        conn.execute(db.text(f'CREATE INDEX {index_name} ON exam_attempt ({index_columns})'))
+                        conn.commit()
+                else:
+                    print(f"   Index {index_name} already exists")
             
             # Set default values for existing exam attempts
             with db.engine.connect() as conn:
                 conn.execute(db.text("UPDATE exam_attempt SET test_set = 'Test 1' WHERE test_set IS NULL"))
+                conn.execute(db.text("UPDATE exam_attempt SET extended_seconds = 0 WHERE extended_seconds IS NULL"))
+                conn.execute(db.text("UPDATE exam_attempt SET state_version = 0 WHERE state_version IS NULL"))
                 conn.commit()
             
             print("✅ ExamAttempt table migration completed")
+            print("   Run backfill_exam_scores.py to fill score columns of past attempts")
             return True
             
         except Exception as e:
@@ -1,11 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 import random
-from flask import redirect, url_for, render_template
+from flask import redirect, url_for, render_template, g, has_app_context
 from flask_login import UserMixin
 from sqlalchemy import event
+import hashlib
 import json
+import math
+import threading
+import time
+from password_hashing import hash_password, verify_user_password
+from audit_writer import submit_audit_event
 
 db = SQLAlchemy()
 
@@ -17,13 +22,21 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     def set_password(self, plain_password: str) -> None:
-        self.password_hash = generate_password_hash(plain_password)
+        self.password_hash = hash_password(plain_password)
 
     def check_password(self, plain_password: str) -> bool:
-        return check_password_hash(self.password_hash, plain_password)
+        """Verify on the bounded hashing pool; upgrades an outdated hash (caller commits)."""
+        return verify_user_password(self, plain_password)
     # Relationships
     attempts = db.relationship('ExamAttempt', backref='user', lazy=True)
 
+LISTENING_PARTS = (1, 2, 3, 4)
+READING_PARTS = (5, 6, 7)
+
+def scaled_section_score(correct):
+    """Scaled section score out of 495 (simple linear scale: 100 correct -> 495)."""
+    return int(round(correct * 4.95))
+
 class ExamAttempt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -35,87 +48,66 @@ class ExamAttempt(db.Model):
     is_completed = db.Column(db.Boolean, default=False)
     status = db.Column(db.String(20), default='in_progress')
     test_set = db.Column(db.String(50))  # Track which test set was used
+    extended_seconds = db.Column(db.Integer, default=0)  # Extra time granted by a proctor
+    state_version = db.Column(db.Integer, default=0)  # Bumped on every answer/status/time change
+
+    # Score breakdown computed once at submit (see apply_score_summary); NULL until scored
+    answered_count = db.Column(db.Integer)
+    part1_correct = db.Column(db.Integer)
+    part2_correct = db.Column(db.Integer)
+    part3_correct = db.Column(db.Integer)
+    part4_correct = db.Column(db.Integer)
+    part5_correct = db.Column(db.Integer)
+    part6_correct = db.Column(db.Integer)
+    part7_correct = db.Column(db.Integer)
+    listening_correct = db.Column(db.Integer)  # Parts 1-4
+    reading_correct = db.Column(db.Integer)    # Parts 5-7
+    listening_score = db.Column(db.Integer)    # Scaled, out of 495
+    reading_score = db.Column(db.Integer)      # Scaled, out of 495
+    total_score = db.Column(db.Integer)        # Scaled, out of 990
     
     # Relationships
     answers = db.relationship('Answer', backref='attempt', lazy=True)
 
+    # Keeps the in-progress set cheap to scan for expired attempts
+    # and the results history cheap to page through
+    __table_args__ = (
+        db.Index('ix_exam_attempt_status_start', 'status', 'start_time'),
+        db.Index('ix_exam_attempt_user_end', 'user_id', 'end_time', 'id'),
+    )
+
     def calculate_scores(self):
         """Calculate and persist the score for this attempt.
-        Compares each saved answer against its question's correct answer,
-        updates Answer.is_correct, and aggregates totals.
+        Marks Answer.is_correct with one set-based UPDATE and aggregates the
+        totals and per-part breakdown with one GROUP BY query.
         Returns a small summary dict for convenience.
         """
-        correct_count = 0
-        answered_count = 0
-
-        for answer in (self.answers or []):
-            question = answer.question
-            if not question:
-                continue
-
-            if answer.selected_answer:
-                answered_count += 1
-                is_correct = str(answer.selected_answer).strip().upper() == str(question.correct_answer or '').strip().upper()
-                # Only update if changed to avoid unnecessary writes
-                if answer.is_correct != is_correct:
-                    answer.is_correct = is_correct
-                if is_correct:
-                    correct_count += 1
-
-        self.correct_answers = correct_count
-        # Basic scoring: number of correct answers. Adjust if scaled scoring is required.
-        self.score = correct_count
+        summary = score_attempts([self.id])[self.id]
+        self.apply_score_summary(summary)
         self.is_completed = True
         self.status = 'completed'
 
         db.session.add(self)
 
-        return {
-            'total_answered': answered_count,
-            'correct': correct_count,
-            'score': self.score,
-        }
-
-    # --- Derived scoring fields expected by templates ---
-    @property
-    def listening_correct(self) -> int:
-        """Number of correct answers in listening (parts 1-4)."""
-        count = 0
-        for ans in (self.answers or []):
-            q = ans.question
-            if not q:
-                continue
-            if q.part in (1, 2, 3, 4) and ans.is_correct:
-                count += 1
-        return count
-
-    @property
-    def reading_correct(self) -> int:
-        """Number of correct answers in reading (parts 5-7)."""
-        count = 0
-        for ans in (self.answers or []):
-            q = ans.question
-            if not q:
-                continue
-            if q.part in (5, 6, 7) and ans.is_correct:
-                count += 1
-        return count
+        return dict(summary, score=self.score)
 
-    @property
-    def listening_score(self) -> int:
-        """Scaled listening score out of 495 (simple linear scale)."""
-        # Simple scaling: 100 correct -> 495; 0 -> 0
-        return int(round(self.listening_correct * 4.95))
+    def apply_score_summary(self, summary):
+        """Store a score_attempts() summary in the persisted score columns."""
+        parts = summary['parts']
+        part_correct = {part: parts.get(part, {}).get('correct', 0) for part in range(1, 8)}
+        for part, correct in part_correct.items():
+            setattr(self, f'part{part}_correct', correct)
 
-    @property
-    def reading_score(self) -> int:
-        """Scaled reading score out of 495 (simple linear scale)."""
-        return int(round(self.reading_correct * 4.95))
+        self.answered_count = summary['total_answered']
+        self.correct_answers = summary['correct']
+        # Basic scoring: number of correct answers. Adjust if scaled scoring is required.
+        self.score = summary['correct']
 
-    @property
-    def total_score(self) -> int:
-        """Total scaled score out of 990."""
-        return self.listening_score + self.reading_score
+        self.listening_correct = sum(part_correct[part] for part in LISTENING_PARTS)
+        self.reading_correct = sum(part_correct[part] for part in READING_PARTS)
+        self.listening_score = scaled_section_score(self.listening_correct)
+        self.reading_score = scaled_section_score(self.reading_correct)
+        self.total_score = self.listening_score + self.reading_score
 
     def get_answers(self):
         """Convenience for templates to list answers."""
@@ -145,6 +137,258 @@ class Answer(db.Model):
     selected_answer = db.Column(db.String(1))
     is_correct = db.Column(db.Boolean, default=False)
     answered_at = db.Column(db.DateTime, default=datetime.utcnow)
+    version = db.Column(db.Integer, default=0)  # Attempt state_version of the last change
+    
+    # One answer row per question per attempt
+    __table_args__ = (db.Index('ix_answer_attempt_question', 'attempt_id', 'question_id', unique=True),)
+
+def bump_state_version(attempt_id):
+    """Advance an attempt's state_version and return the new value. The caller commits."""
+    table = ExamAttempt.__table__
+    db.session.execute(
+        table.update().where(table.c.id == attempt_id)
+        .values(state_version=db.func.coalesce(table.c.state_version, 0) + 1)
+    )
+    return db.session.execute(
+        db.select(table.c.state_version).where(table.c.id == attempt_id)
+    ).scalar()
+
+def claim_attempts(attempt_ids, status):
+    """Move the given attempts from 'in_progress' to status with one conditional UPDATE
+    and return the ids this transaction claimed. An attempt claimed meanwhile by a
+    concurrent submit or sweep is left out, so only one of them scores it. The caller commits.
+    """
+    attempt_ids = list(attempt_ids)
+    if not attempt_ids:
+        return []
+    return db.session.execute(
+        db.update(ExamAttempt)
+        .where(ExamAttempt.id.in_(attempt_ids), ExamAttempt.status == 'in_progress')
+        .values(status=status).returning(ExamAttempt.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+
+def _answer_is_correct(correct_answer):
+    """SQL expression: the answer's selection matches correct_answer (case/space-insensitive)"""
+    answered = db.and_(Answer.selected_answer.isnot(None), Answer.selected_answer != '')
+    return db.case(
+        (db.and_(answered, db.func.upper(db.func.trim(Answer.selected_answer))
+                 == db.func.upper(db.func.trim(correct_answer))), True),
+        else_=False
+    )
+
+def _correct_key_subquery():
+    return db.select(Question.correct_answer).where(Question.id == Answer.question_id).scalar_subquery()
+
+def mark_answers_correct(attempt_ids):
+    """Set Answer.is_correct for the given attempts with one UPDATE. The caller commits."""
+    db.session.execute(
+        db.update(Answer).where(Answer.attempt_id.in_(list(attempt_ids)))
+        .values(is_correct=_answer_is_correct(_correct_key_subquery()))
+        .execution_options(synchronize_session=False)
+    )
+
+def score_attempts(attempt_ids):
+    """Mark Answer.is_correct for the given attempts in one UPDATE and return
+    {attempt_id: {'total_answered', 'correct', 'parts': {part: {'answered', 'correct'}}}}
+    from one aggregate query. The caller commits.
+    """
+    attempt_ids = list(attempt_ids)
+    summaries = {
+        attempt_id: {'total_answered': 0, 'correct': 0, 'parts': {}}
+        for attempt_id in attempt_ids
+    }
+    if not attempt_ids:
+        return summaries
+
+    mark_answers_correct(attempt_ids)
+    answered = db.and_(Answer.selected_answer.isnot(None), Answer.selected_answer != '')
+
+    rows = db.session.query(
+        Answer.attempt_id, Question.part, db.func.count(Answer.id),
+        db.func.sum(db.case((Answer.is_correct == True, 1), else_=0))
+    ).join(Question, Answer.question_id == Question.id)\
+        .filter(Answer.attempt_id.in_(attempt_ids), answered)\
+        .group_by(Answer.attempt_id, Question.part).all()
+
+    for attempt_id, part, answered_count, correct_count in rows:
+        summary = summaries[attempt_id]
+        summary['parts'][part] = {'answered': answered_count, 'correct': int(correct_count or 0)}
+        summary['total_answered'] += answered_count
+        summary['correct'] += int(correct_count or 0)
+    return summaries
+
+class RescoreQueue(db.Model):
+    """Questions whose correct_answer changed and whose scored attempts need adjusting"""
+    id = db.Column(db.Integer, primary_key=True)
+    question_id = db.Column(db.Integer, nullable=False, index=True)
+    queued_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+@event.listens_for(db.session, 'before_flush')
+def _queue_answer_key_changes(session, flush_context, instances):
+    """Queue a rescore for every persistent Question whose correct_answer is being changed"""
+    for obj in session.dirty:
+        if not isinstance(obj, Question) or obj.id is None:
+            continue
+        history = db.inspect(obj).attrs.correct_answer.history
+        # An unloaded old value (empty deleted) is treated as a change
+        if history.added and list(history.added) != list(history.deleted):
+            session.add(RescoreQueue(question_id=obj.id))
+
+def rescore_questions(question_ids):
+    """Re-mark the answers to the given questions and adjust the stored scores of
+    the scored attempts they belong to by the resulting deltas. Only affected
+    attempts are touched; item_stats follow. Returns the number of attempts
+    adjusted. The caller commits.
+    """
+    question_ids = list(question_ids)
+    if not question_ids:
+        return 0
+
+    # Per-attempt, per-part change in correct answers under the current keys
+    was_correct = db.case((Answer.is_correct == True, 1), else_=0)
+    now_correct = db.case((_answer_is_correct(Question.correct_answer), 1), else_=0)
+    delta = db.func.sum(now_correct - was_correct)
+    rows = db.session.query(Answer.attempt_id, Question.part, delta)\
+        .join(Question, Answer.question_id == Question.id)\
+        .join(ExamAttempt, Answer.attempt_id == ExamAttempt.id)\
+        .filter(Answer.question_id.in_(question_ids), ExamAttempt.total_score.isnot(None))\
+        .group_by(Answer.attempt_id, Question.part)\
+        .having(delta != 0).all()
+
+    db.session.execute(
+        db.update(Answer).where(Answer.question_id.in_(question_ids))
+        .values(is_correct=_answer_is_correct(_correct_key_subquery()))
+        .execution_options(synchronize_session=False)
+    )
+
+    deltas = {}
+    for attempt_id, part, change in rows:
+        if 1 <= part <= 7:
+            deltas.setdefault(attempt_id, {})[part] = int(change)
+
+    part_columns = [getattr(ExamAttempt, f'part{part}_correct') for part in range(1, 8)]
+    rollup_columns = [getattr(ExamAttempt, name) for name in _ROLLUP_ATTRIBUTES]
+    attempt_ids = sorted(deltas)
+    for i in range(0, len(attempt_ids), 500):
+        chunk = attempt_ids[i:i + 500]
+        current = db.session.query(ExamAttempt.id, *part_columns, *rollup_columns)\
+            .filter(ExamAttempt.id.in_(chunk)).all()
+
+        updates = []
+        rollup_changes = []
+        rescored_users = set()
+        for row in current:
+            attempt_id, part_correct = row[0], row[1:8]
+            part_correct = {
+                part: (count or 0) + deltas[attempt_id].get(part, 0)
+                for part, count in zip(range(1, 8), part_correct)
+            }
+            listening = sum(part_correct[part] for part in LISTENING_PARTS)
+            reading = sum(part_correct[part] for part in READING_PARTS)
+            values = {f'part{part}_correct': count for part, count in part_correct.items()}
+            values.update(
+                id=attempt_id,
+                correct_answers=listening + reading,
+                score=listening + reading,
+                listening_correct=listening,
+                reading_correct=reading,
+                listening_score=scaled_section_score(listening),
+                reading_score=scaled_section_score(reading),
+            )
+            values['total_score'] = values['listening_score'] + values['reading_score']
+            updates.append(values)
+
+            # Bulk UPDATEs bypass the flush hooks, so move the rollups along here
+            old = dict(zip(_ROLLUP_ATTRIBUTES, row[8:]))
+            rescored_users.add(old['user_id'])
+            new = dict(old, **{name: values[name] for name in _ROLLUP_ATTRIBUTES if name in values})
+            for sign, attributes in ((-1, old), (1, new)):
+                contribution = _rollup_contribution(attributes.get)
+                if contribution:
+                    rollup_changes.append((sign,) + contribution)
+
+        if updates:
+            # The new totals move every other item these attempts answered
+            connection = db.session.connection()
+            old_items = _item_stat_sums(connection, chunk, exclude_questions=question_ids)
+            db.session.execute(db.update(ExamAttempt), updates)
+            _apply_rollup_changes(connection, rollup_changes)
+            _invalidate_cohorts(connection, group_ids={
+                group_id for cohorts in _user_cohorts(connection, rescored_users).values()
+                for _, group_id in cohorts if group_id
+            })
+            _apply_item_stat_changes(connection, [
+                (-1, old_items), (1, _item_stat_sums(connection, chunk, exclude_questions=question_ids))
+            ])
+
+    # Responses to the re-keyed items are simply recounted
+    rebuild_item_stats(question_ids)
+    return len(attempt_ids)
+
+def process_rescore_queue(batch_size=500):
+    """Apply queued answer-key changes in batches, committing after each.
+    Returns the number of attempts adjusted.
+    """
+    adjusted = 0
+    while True:
+        entries = db.session.query(RescoreQueue.id, RescoreQueue.question_id)\
+            .order_by(RescoreQueue.id).limit(batch_size).all()
+        if not entries:
+            return adjusted
+
+        adjusted += rescore_questions(sorted({question_id for _, question_id in entries}))
+        RescoreQueue.query.filter(RescoreQueue.id.in_([entry_id for entry_id, _ in entries]))\
+            .delete(synchronize_session=False)
+        # Scores were changed with bulk UPDATEs, which the counters do not see
+        refresh_stats_counters(['score_sum'])
+        db.session.commit()
+
+def upsert_answer_rows(rows, only_if_newer=False):
+    """Insert or update answer rows with INSERT ... ON CONFLICT DO UPDATE.
+    Each row has attempt_id, question_id, selected_answer and answered_at. With
+    only_if_newer, an existing row is only overwritten by a later answered_at.
+    Each attempt's state_version is bumped once and stamped on its rows.
+    The caller commits.
+    """
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    versions = {}
+    for attempt_id in sorted({row['attempt_id'] for row in rows}):
+        versions[attempt_id] = bump_state_version(attempt_id)
+    rows = [dict(row, is_correct=False, version=versions[row['attempt_id']]) for row in rows]
+
+    table = Answer.__table__
+    # Keep each statement well under SQLite's bound-parameter limit
+    for i in range(0, len(rows), 500):
+        stmt = insert(table).values(rows[i:i + 500])
+        where = None
+        if only_if_newer:
+            where = db.or_(table.c.answered_at.is_(None), table.c.answered_at <= stmt.excluded.answered_at)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['attempt_id', 'question_id'],
+            set_={'selected_answer': stmt.excluded.selected_answer,
+                  'answered_at': stmt.excluded.answered_at,
+                  'version': stmt.excluded.version},
+            where=where
+        )
+        db.session.execute(stmt)
+
+def upsert_answers(attempt_id, selections):
+    """Insert or update answers for an attempt in a single statement.
+    selections maps question_id -> selected answer letter. The caller commits.
+    """
+    now = datetime.utcnow()
+    upsert_answer_rows([
+        {'attempt_id': attempt_id, 'question_id': question_id,
+         'selected_answer': answer, 'answered_at': now}
+        for question_id, answer in selections.items()
+    ])
 
 def init_sample_questions():
     """Initialize the database with sample questions"""
@@ -169,6 +413,11 @@ class Role(db.Model):
     # Relationships
     user_roles = db.relationship('UserRole', backref='role', lazy=True)
 
+    @property
+    def permission_mask(self) -> int:
+        """This role's permissions compiled to a bitmask (see PERMISSIONS)."""
+        return permission_mask(self.permissions)
+
 class UserRole(db.Model):
     """Many-to-many relationship between users and roles"""
     id = db.Column(db.Integer, primary_key=True)
@@ -258,11 +507,141 @@ class AuditLog(db.Model):
     old_values = db.Column(db.JSON)  # Previous values
     new_values = db.Column(db.JSON)  # New values
     ip_address = db.Column(db.String(45))  # IPv4 or IPv6
-    user_agent = db.Column(db.Text)
+    user_agent = db.Column(db.Text)  # Legacy rows only; see user_agent_id
+    user_agent_id = db.Column(db.Integer, db.ForeignKey('user_agents.id'))
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     user = db.relationship('User', backref='audit_logs')
+    agent = db.relationship('UserAgent')
+
+    archived = False  # See audit_archive.ArchivedAuditLog
+
+    @property
+    def user_agent_text(self):
+        return self.agent.value if self.agent is not None else self.user_agent
+
+    # Back the (timestamp, id) keyset pages and the exact/prefix filters (see audit_search.py)
+    __table_args__ = (
+        db.Index('ix_audit_log_timestamp', 'timestamp', 'id'),
+        db.Index('ix_audit_log_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_audit_log_action_timestamp', 'action', 'timestamp', 'id'),
+        db.Index('ix_audit_log_resource', 'resource_type', 'resource_id'),
+    )
+
+class UserAgent(db.Model):
+    """Distinct User-Agent strings, stored once and referenced by audit rows"""
+    __tablename__ = 'user_agents'
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of value
+    value = db.Column(db.Text, nullable=False)
+
+class AuditArchiveEntry(db.Model):
+    """Thin lookup row for an audit event moved to the compressed archive (see audit_archive.py).
+    The full event is in the day's segment for its timestamp.
+    """
+    __tablename__ = 'audit_log_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # The original AuditLog id
+    timestamp = db.Column(db.DateTime, nullable=False)
+    user_id = db.Column(db.Integer)
+    action = db.Column(db.String(100), nullable=False)
+    resource_type = db.Column(db.String(50), nullable=False)
+    resource_id = db.Column(db.String(50))
+
+    __table_args__ = (
+        db.Index('ix_audit_log_archive_timestamp', 'timestamp', 'id'),
+        db.Index('ix_audit_log_archive_user_timestamp', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_audit_log_archive_action_timestamp', 'action', 'timestamp', 'id'),
+        db.Index('ix_audit_log_archive_resource', 'resource_type', 'resource_id'),
+    )
+
+# =============================================================================
+# Cache Versioning Model
+# =============================================================================
+
+class CacheVersion(db.Model):
+    """Shared version stamps used to invalidate per-worker in-memory caches"""
+    name = db.Column(db.String(50), primary_key=True)  # e.g., "question_bank"
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class StatsCounter(db.Model):
+    """Running totals for the admin dashboards, kept current on every flush"""
+    __tablename__ = 'stats_counters'
+    name = db.Column(db.String(50), primary_key=True)  # e.g., "total_users"
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class ScoreRollup(db.Model):
+    """Daily and weekly exam aggregates per test set and cohort, kept current on every flush.
+    An attempt counts toward the day (and the Monday-based week) it started in.
+    program_id = group_id = 0 covers all students; group_id = 0 alone covers a whole program.
+    Cohort rows follow current memberships: when a student changes groups, or a group
+    changes program, the student's attempts move to the new cohort rows.
+    """
+    __tablename__ = 'score_rollups'
+    period = db.Column(db.String(10), primary_key=True)  # "day" or "week"
+    period_start = db.Column(db.Date, primary_key=True)
+    test_set = db.Column(db.String(50), primary_key=True)  # "" when the attempt has none
+    program_id = db.Column(db.Integer, primary_key=True)
+    group_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    scored = db.Column(db.Integer, nullable=False, default=0)  # Completed with a scaled score
+    score_sum = db.Column(db.BigInteger, nullable=False, default=0)  # Of total_score
+    listening_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    reading_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    # Histogram of total_score (see SCORE_BUCKETS)
+    score_0_200 = db.Column(db.Integer, nullable=False, default=0)
+    score_201_400 = db.Column(db.Integer, nullable=False, default=0)
+    score_401_600 = db.Column(db.Integer, nullable=False, default=0)
+    score_601_800 = db.Column(db.Integer, nullable=False, default=0)
+    score_801_990 = db.Column(db.Integer, nullable=False, default=0)
+
+class ItemStat(db.Model):
+    """Item analysis per question over the answered responses of scored attempts,
+    kept current whenever attempts are scored. Scores are attempt total_score.
+    """
+    __tablename__ = 'item_stats'
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    responses = db.Column(db.Integer, nullable=False, default=0)
+    option_a_count = db.Column(db.Integer, nullable=False, default=0)
+    option_b_count = db.Column(db.Integer, nullable=False, default=0)
+    option_c_count = db.Column(db.Integer, nullable=False, default=0)
+    option_d_count = db.Column(db.Integer, nullable=False, default=0)
+    correct_count = db.Column(db.Integer, nullable=False, default=0)
+    # Running sums for the point-biserial correlation
+    score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    score_sq_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    correct_score_sum = db.Column(db.BigInteger, nullable=False, default=0)
+    p_value = db.Column(db.Float, index=True)  # Proportion correct; NULL without responses
+    discrimination = db.Column(db.Float)  # Point-biserial; NULL when undefined
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    question = db.relationship('Question', backref=db.backref('item_stat', uselist=False))
+
+class CohortStat(db.Model):
+    """Cached exam aggregates for one year, program or group over its active members'
+    attempts. Marked stale (and its version bumped) when the node or a descendant
+    changes; cohort_report.py recomputes stale rows on read.
+    """
+    __tablename__ = 'cohort_stats'
+    node_type = db.Column(db.String(10), primary_key=True)  # "year", "program" or "group"
+    node_id = db.Column(db.Integer, primary_key=True)
+    members = db.Column(db.Integer, nullable=False, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    completions = db.Column(db.Integer, nullable=False, default=0)
+    scored = db.Column(db.Integer, nullable=False, default=0)  # Completed with a scaled score
+    score_sum = db.Column(db.BigInteger, nullable=False, default=0)  # Of total_score
+    # Histogram of total_score (see SCORE_BUCKETS)
+    score_0_200 = db.Column(db.Integer, nullable=False, default=0)
+    score_201_400 = db.Column(db.Integer, nullable=False, default=0)
+    score_401_600 = db.Column(db.Integer, nullable=False, default=0)
+    score_601_800 = db.Column(db.Integer, nullable=False, default=0)
+    score_801_990 = db.Column(db.Integer, nullable=False, default=0)
+    is_stale = db.Column(db.Boolean, nullable=False, default=False)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 # =============================================================================
 # Notification Models
@@ -324,34 +703,904 @@ def get_user_roles(user_id):
         db.or_(UserRole.expires_at.is_(None), UserRole.expires_at > datetime.utcnow())
     ).all()
 
+# Permission registry: each permission's position is its bit in a permission mask.
+# Append new permissions at the end so existing bit positions never move.
+PERMISSIONS = (
+    'user.create', 'user.read', 'user.update', 'user.delete',
+    'role.create', 'role.read', 'role.update', 'role.delete',
+    'org.create', 'org.read', 'org.update', 'org.delete',
+    'question.create', 'question.read', 'question.update', 'question.delete',
+    'exam.create', 'exam.read', 'exam.update', 'exam.delete',
+    'session.create', 'session.read', 'session.update', 'session.delete',
+    'report.read', 'audit.read', 'system.admin'
+)
+PERMISSION_BITS = {permission: 1 << position for position, permission in enumerate(PERMISSIONS)}
+
+def permission_mask(permissions):
+    """Compile permission strings into an integer mask; unregistered names are ignored"""
+    mask = 0
+    for permission in permissions or ():
+        mask |= PERMISSION_BITS.get(permission, 0)
+    return mask
+
+def permissions_from_mask(mask):
+    """Permission strings whose bits are set in mask"""
+    return [permission for permission, bit in PERMISSION_BITS.items() if mask & bit]
+
+def mask_allows(mask, permission):
+    """Bitwise check of one permission against a compiled mask"""
+    bit = PERMISSION_BITS.get(permission, 0)
+    return bit != 0 and mask & bit == bit
+
+# Shared version stamp of everyone's effective permissions
+PERMISSIONS_CACHE = 'permissions'
+
+# How often (seconds) a worker re-reads the permissions version stamp
+PERMISSION_VERSION_CHECK_INTERVAL = 5
+
+# user_id -> (version, valid_until, permission mask)
+_permission_cache = {}
+_permission_lock = threading.Lock()
+_permission_version = None
+_permission_checked_at = 0.0
+
+def _current_permission_version():
+    """Shared permissions version, re-read at most every PERMISSION_VERSION_CHECK_INTERVAL"""
+    global _permission_version, _permission_checked_at
+    now = time.monotonic()
+    if _permission_version is None or now - _permission_checked_at >= PERMISSION_VERSION_CHECK_INTERVAL:
+        _permission_version = get_cache_version(PERMISSIONS_CACHE)
+        _permission_checked_at = now
+    return _permission_version
+
+def _load_permission_mask(user_id):
+    """One Role/UserRole query: (OR of the role masks, earliest future role expiry or None)"""
+    now = datetime.utcnow()
+    rows = db.session.query(Role.permissions, UserRole.expires_at).join(UserRole).filter(
+        UserRole.user_id == user_id,
+        UserRole.is_active == True,
+        Role.is_active == True,
+        db.or_(UserRole.expires_at.is_(None), UserRole.expires_at > now)
+    ).all()
+    mask = 0
+    for role_permissions, _ in rows:
+        mask |= permission_mask(role_permissions)
+    expiries = [expires_at for _, expires_at in rows if expires_at is not None]
+    return mask, min(expiries, default=None)
+
+def get_permission_mask(user_id):
+    """A user's effective permissions as one integer mask, resolved once per request
+    and cached per worker until the permissions version changes or a role expires.
+    """
+    request_cache = None
+    if has_app_context():
+        request_cache = g.setdefault('_permission_masks', {})
+        if user_id in request_cache:
+            return request_cache[user_id]
+
+    version = _current_permission_version()
+    cached = _permission_cache.get(user_id)
+    if cached is not None and cached[0] == version and (cached[1] is None or datetime.utcnow() < cached[1]):
+        mask = cached[2]
+    else:
+        mask, valid_until = _load_permission_mask(user_id)
+        with _permission_lock:
+            _permission_cache[user_id] = (version, valid_until, mask)
+
+    if request_cache is not None:
+        request_cache[user_id] = mask
+    return mask
+
+def invalidate_permissions():
+    """Bump the shared permissions version after role or role-assignment changes
+    and drop this worker's cached entries. The caller commits.
+    """
+    global _permission_version
+    bump_cache_version(PERMISSIONS_CACHE)
+    with _permission_lock:
+        _permission_cache.clear()
+        _permission_version = None
+    if has_app_context():
+        g.pop('_permission_masks', None)
+
 def get_user_permissions(user_id):
     """Get all permissions for a user across all their roles"""
-    roles = get_user_roles(user_id)
-    permissions = set()
-    for role in roles:
-        if role.permissions:
-            permissions.update(role.permissions)
-    return list(permissions)
+    return permissions_from_mask(get_permission_mask(user_id))
 
 def has_permission(user_id, permission):
     """Check if user has a specific permission"""
-    permissions = get_user_permissions(user_id)
-    return permission in permissions
+    return mask_allows(get_permission_mask(user_id), permission)
 
 def log_audit(user_id, action, resource_type, resource_id=None, old_values=None, new_values=None, ip_address=None, user_agent=None):
-    """Log an audit event"""
-    audit = AuditLog(
-        user_id=user_id,
-        action=action,
-        resource_type=resource_type,
-        resource_id=str(resource_id) if resource_id else None,
-        old_values=old_values,
-        new_values=new_values,
-        ip_address=ip_address,
-        user_agent=user_agent
+    """Log an audit event: queued for the background writer (see audit_writer.py),
+    or inserted and committed right away when the queue is full or not running.
+    """
+    row = {
+        'user_id': user_id,
+        'action': action,
+        'resource_type': resource_type,
+        'resource_id': str(resource_id) if resource_id else None,
+        'old_values': old_values,
+        'new_values': new_values,
+        'ip_address': ip_address,
+        'user_agent': user_agent,
+        'timestamp': datetime.utcnow(),
+    }
+    if not submit_audit_event(row):
+        write_audit_rows([row])
+
+def write_audit_rows(rows):
+    """Insert AuditLog row dicts with multi-row INSERTs and commit.
+    User-Agent strings are stored once in user_agents and referenced by id.
+    """
+    try:
+        agents = user_agent_ids({row.get('user_agent') for row in rows})
+        rows = [
+            dict(row, user_agent=None, user_agent_id=agents.get(row.get('user_agent')))
+            for row in rows
+        ]
+        table = AuditLog.__table__
+        # Keep each statement well under SQLite's bound-parameter limit
+        for i in range(0, len(rows), 200):
+            db.session.execute(table.insert().values(rows[i:i + 200]))
+        # Core inserts skip the flush hook that maintains the counter
+        adjust_stats_counters(db.session, {'total_audit_logs': len(rows)})
+        db.session.commit()
+    except Exception:
+        # Ids inserted by the failed transaction must not be reused
+        with _user_agent_lock:
+            _user_agent_ids.clear()
+        raise
+
+# User-Agent string -> user_agents.id, per worker; shared by request threads and the audit writer
+_user_agent_ids = {}
+_user_agent_lock = threading.Lock()
+MAX_CACHED_USER_AGENTS = 10000
+
+def user_agent_ids(values):
+    """{User-Agent string: user_agents id} for the given strings, inserting unseen ones.
+    Runs in the caller's transaction.
+    """
+    values = {value for value in values if value}
+    with _user_agent_lock:
+        found = {value: _user_agent_ids[value] for value in values if value in _user_agent_ids}
+    missing = {hashlib.sha256(value.encode('utf-8')).hexdigest(): value
+               for value in values if value not in found}
+    if missing:
+        if db.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+
+        table = UserAgent.__table__
+        db.session.execute(
+            insert(table).values([{'digest': digest, 'value': value} for digest, value in missing.items()])
+            .on_conflict_do_nothing(index_elements=['digest'])
+        )
+        looked_up = {
+            missing[digest]: agent_id for digest, agent_id in db.session.execute(
+                db.select(table.c.digest, table.c.id).where(table.c.digest.in_(list(missing)))
+            )
+        }
+        found.update(looked_up)
+        with _user_agent_lock:
+            if len(_user_agent_ids) + len(looked_up) > MAX_CACHED_USER_AGENTS:
+                _user_agent_ids.clear()
+            _user_agent_ids.update(looked_up)
+    return found
+
+# =============================================================================
+# Cache Version Helpers
+# =============================================================================
+
+def get_cache_version(name):
+    """Return the current shared version for a named cache (0 if never bumped)"""
+    return db.session.query(CacheVersion.version).filter_by(name=name).scalar() or 0
+
+def bump_cache_version(name):
+    """Increment the shared version for a named cache. The caller commits."""
+    updated = CacheVersion.query.filter_by(name=name).update(
+        {CacheVersion.version: CacheVersion.version + 1, CacheVersion.updated_at: datetime.utcnow()},
+        synchronize_session=False
     )
-    db.session.add(audit)
-    db.session.commit()
+    if not updated:
+        db.session.add(CacheVersion(name=name, version=1))
+
+# =============================================================================
+# Dashboard Counters
+# =============================================================================
+
+# Counter name -> query computing it from scratch (used to seed and to repair drift)
+STATS_COUNTER_QUERIES = {
+    'total_users': lambda: db.session.query(db.func.count(User.id)),
+    'active_users': lambda: db.session.query(db.func.count(User.id)).filter(User.is_active == True),
+    'total_questions': lambda: db.session.query(db.func.count(Question.id)),
+    'total_exams': lambda: db.session.query(db.func.count(ExamAttempt.id)),
+    'completed_exams': lambda: db.session.query(db.func.count(ExamAttempt.id)).filter(ExamAttempt.is_completed == True),
+    'scored_exams': lambda: db.session.query(db.func.count(ExamAttempt.score))
+        .filter(ExamAttempt.is_completed == True),
+    'score_sum': lambda: db.session.query(db.func.coalesce(db.func.sum(ExamAttempt.score), 0))
+        .filter(ExamAttempt.is_completed == True),
+    'total_roles': lambda: db.session.query(db.func.count(Role.id)),
+    'total_audit_logs': lambda: db.session.query(db.func.count(AuditLog.id)),
+}
+
+def _user_stats(get):
+    return {'total_users': 1, 'active_users': int(get('is_active') is True)}
+
+def _exam_stats(get):
+    completed = bool(get('is_completed'))
+    score = get('score')
+    return {
+        'total_exams': 1,
+        'completed_exams': int(completed),
+        'scored_exams': int(completed and score is not None),
+        'score_sum': (score or 0) if completed else 0,
+    }
+
+# Model -> what one row contributes to the counters, given an attribute getter
+_STATS_CONTRIBUTIONS = {
+    User: _user_stats,
+    Question: lambda get: {'total_questions': 1},
+    ExamAttempt: _exam_stats,
+    Role: lambda get: {'total_roles': 1},
+    AuditLog: lambda get: {'total_audit_logs': 1},
+}
+
+# Shared version stamp of completed-attempt results (scores, completion, end times)
+EXAM_RESULTS_CACHE = 'exam_results'
+
+# Counters whose change means completed results changed
+_EXAM_RESULT_COUNTERS = ('completed_exams', 'scored_exams', 'score_sum')
+
+# ExamAttempt attributes whose change on a completed attempt alters reported results
+_EXAM_RESULT_ATTRIBUTES = ('is_completed', 'score', 'total_score', 'end_time')
+
+# ExamAttempt attributes the score rollups read
+_ROLLUP_ATTRIBUTES = (
+    'user_id', 'start_time', 'test_set', 'is_completed',
+    'total_score', 'listening_score', 'reading_score'
+)
+
+# UserGroup attributes that decide which cohorts a student's attempts count toward
+_MEMBERSHIP_ATTRIBUTES = ('user_id', 'group_id', 'is_active')
+
+# Attributes the counters, rollups and cohort stats read; their old values must be known when they change
+_STATS_ATTRIBUTES = {
+    User: ('is_active',),
+    ExamAttempt: tuple(dict.fromkeys(('is_completed', 'score', 'end_time') + _ROLLUP_ATTRIBUTES)),
+    UserGroup: _MEMBERSHIP_ATTRIBUTES,
+    Group: ('program_id',),
+    Program: ('year_id',),
+}
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    """No-op 'set' listener; registering it with active_history loads the old value"""
+
+for _model, _names in _STATS_ATTRIBUTES.items():
+    for _name in _names:
+        event.listen(getattr(_model, _name), 'set', _keep_old_value, active_history=True)
+
+@event.listens_for(db.session, 'before_flush')
+def _load_stats_attributes(session, flush_context, instances):
+    """Load expired counter attributes of changed/deleted rows while the old row still exists"""
+    with session.no_autoflush:
+        for obj in list(session.dirty) + list(session.deleted):
+            for name in _STATS_ATTRIBUTES.get(type(obj), ()):
+                getattr(obj, name)
+
+def _new_value(state, name):
+    history = state.attrs[name].history
+    values = history.added or history.unchanged
+    return values[0] if values else None
+
+def _old_value(state, name):
+    history = state.attrs[name].history
+    values = history.deleted or history.unchanged
+    return values[0] if values else None
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_stats_counters(session, flush_context):
+    """Apply this flush's inserts, deletes and relevant updates to stats_counters,
+    one UPDATE per changed counter, inside the same transaction.
+    """
+    deltas = {}
+    results_changed = False
+
+    def add(contribution, sign):
+        for name, value in contribution.items():
+            if value:
+                deltas[name] = deltas.get(name, 0) + sign * value
+
+    for obj in session.new:
+        contribution = _STATS_CONTRIBUTIONS.get(type(obj))
+        if contribution:
+            state = db.inspect(obj)
+            add(contribution(lambda name: _new_value(state, name)), 1)
+    for obj in session.deleted:
+        contribution = _STATS_CONTRIBUTIONS.get(type(obj))
+        if contribution:
+            state = db.inspect(obj)
+            add(contribution(lambda name: _old_value(state, name)), -1)
+    for obj in session.dirty:
+        contribution = _STATS_CONTRIBUTIONS.get(type(obj))
+        if contribution and session.is_modified(obj, include_collections=False):
+            state = db.inspect(obj)
+            add(contribution(lambda name: _new_value(state, name)), 1)
+            add(contribution(lambda name: _old_value(state, name)), -1)
+            if isinstance(obj, ExamAttempt) and not results_changed:
+                results_changed = (
+                    (_new_value(state, 'is_completed') or _old_value(state, 'is_completed'))
+                    and any(state.attrs[name].history.has_changes() for name in _EXAM_RESULT_ATTRIBUTES)
+                )
+
+    connection = session.connection()
+    changed = adjust_stats_counters(connection, deltas)
+    results_changed = results_changed or any(name in _EXAM_RESULT_COUNTERS for name in changed)
+
+    if results_changed:
+        # Same transaction as the change; the ORM can't add objects mid-flush, so use Core
+        versions = CacheVersion.__table__
+        updated = connection.execute(
+            versions.update().where(versions.c.name == EXAM_RESULTS_CACHE)
+            .values(version=versions.c.version + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        if not updated:
+            connection.execute(versions.insert().values(
+                name=EXAM_RESULTS_CACHE, version=1, updated_at=datetime.utcnow()
+            ))
+
+def adjust_stats_counters(connection, deltas):
+    """Add {counter name: delta} to stats_counters, one UPDATE per non-zero delta, in the
+    caller's transaction. Also for Core writes that bypass the flush hook. Returns the
+    names changed.
+    """
+    table = StatsCounter.__table__
+    changed = []
+    for name, delta in deltas.items():
+        if delta:
+            connection.execute(
+                table.update().where(table.c.name == name)
+                .values(value=table.c.value + delta, updated_at=datetime.utcnow())
+            )
+            changed.append(name)
+    return changed
+
+def refresh_stats_counters(names=None):
+    """Recompute counters from scratch (all, or the given names). The caller commits.
+    Used to seed the table and by bulk tools that bypass ORM flushes.
+    """
+    names = list(names or STATS_COUNTER_QUERIES)
+    if any(name in _EXAM_RESULT_COUNTERS for name in names):
+        # Bulk rescoring bypasses the flush hook, so treat it as a results change
+        bump_cache_version(EXAM_RESULTS_CACHE)
+    for name in names:
+        value = STATS_COUNTER_QUERIES[name]().scalar() or 0
+        counter = db.session.get(StatsCounter, name)
+        if counter is None:
+            db.session.add(StatsCounter(name=name, value=value))
+        else:
+            counter.value = value
+
+def get_stats_counters():
+    """All dashboard counters from one primary-key scan; seeds missing counters"""
+    values = dict(db.session.query(StatsCounter.name, StatsCounter.value).all())
+    missing = [name for name in STATS_COUNTER_QUERIES if name not in values]
+    if missing:
+        refresh_stats_counters(missing)
+        db.session.commit()
+        values = dict(db.session.query(StatsCounter.name, StatsCounter.value).all())
+    return values
+
+# =============================================================================
+# Score Rollups
+# =============================================================================
+
+# (ScoreRollup histogram column, lowest total_score, highest total_score)
+SCORE_BUCKETS = (
+    ('score_0_200', 0, 200),
+    ('score_201_400', 201, 400),
+    ('score_401_600', 401, 600),
+    ('score_601_800', 601, 800),
+    ('score_801_990', 801, 990),
+)
+
+# Summable ScoreRollup columns
+_ROLLUP_VALUES = ('attempts', 'completions', 'scored', 'score_sum', 'listening_sum', 'reading_sum') \
+    + tuple(column for column, _, _ in SCORE_BUCKETS)
+
+def _score_bucket(total_score):
+    for column, _, highest in SCORE_BUCKETS:
+        if total_score <= highest:
+            return column
+    return SCORE_BUCKETS[-1][0]
+
+def _rollup_contribution(get):
+    """((start day, test set, user id), column values) for one attempt, or None"""
+    started = get('start_time')
+    if started is None:
+        return None
+    values = {'attempts': 1}
+    if get('is_completed'):
+        values['completions'] = 1
+        total_score = get('total_score')
+        if total_score is not None:
+            values.update(scored=1, score_sum=total_score,
+                          listening_sum=get('listening_score') or 0,
+                          reading_sum=get('reading_score') or 0)
+            values[_score_bucket(total_score)] = 1
+    return (started.date(), get('test_set') or '', get('user_id')), values
+
+def _cohort_keys(memberships):
+    """user_id -> [(program_id, group_id), ...] from (user_id, program_id, group_id)
+    memberships, including the whole-program rows
+    """
+    cohorts = {}
+    for user_id, program_id, group_id in memberships:
+        keys = cohorts.setdefault(user_id, [])
+        for key in ((program_id, 0), (program_id, group_id)):
+            if key not in keys:
+                keys.append(key)
+    return cohorts
+
+def _user_cohorts(connection, user_ids=None):
+    """user_id -> [(program_id, group_id), ...] from active memberships, including
+    the whole-program rows; users without a group are absent. None = all users.
+    """
+    query = db.select(UserGroup.user_id, Group.program_id, Group.id)\
+        .join(Group, UserGroup.group_id == Group.id)\
+        .where(UserGroup.is_active == True)
+    if user_ids is not None:
+        query = query.where(UserGroup.user_id.in_(list(user_ids)))
+    return _cohort_keys(connection.execute(query))
+
+def _previous_cohorts(session, connection):
+    """{user_id: cohorts before this flush} for every user whose memberships, or whose
+    groups' programs, this flush changed. Rebuilt from the flushed rows with the
+    flush's membership and group changes undone.
+    """
+    users = set()
+    memberships = {}  # UserGroup id -> (user_id, group_id, is_active) before the flush; None if new
+    programs = {}     # Group id -> program_id before the flush
+    moved_groups = []
+
+    def before(state):
+        return tuple(_old_value(state, name) for name in _MEMBERSHIP_ATTRIBUTES)
+
+    for obj in session.new:
+        if isinstance(obj, UserGroup):
+            users.add(obj.user_id)
+            memberships[obj.id] = None
+    for obj in session.deleted:
+        if isinstance(obj, UserGroup):
+            memberships[obj.id] = before(db.inspect(obj))
+            users.add(memberships[obj.id][0])
+        elif isinstance(obj, Group):
+            programs[obj.id] = _old_value(db.inspect(obj), 'program_id')
+    for obj in session.dirty:
+        state = db.inspect(obj)
+        if isinstance(obj, UserGroup) and any(
+            state.attrs[name].history.has_changes() for name in _MEMBERSHIP_ATTRIBUTES
+        ):
+            memberships[obj.id] = before(state)
+            users.update((memberships[obj.id][0], obj.user_id))
+        elif isinstance(obj, Group) and state.attrs.program_id.history.has_changes():
+            programs[obj.id] = _old_value(state, 'program_id')
+            moved_groups.append(obj.id)
+
+    if moved_groups:
+        users.update(connection.execute(
+            db.select(UserGroup.user_id)
+            .where(UserGroup.group_id.in_(moved_groups), UserGroup.is_active == True)
+        ).scalars())
+    users.discard(None)
+    if not users:
+        return {}
+
+    rows = {
+        membership_id: (user_id, group_id, is_active)
+        for membership_id, user_id, group_id, is_active in connection.execute(
+            db.select(UserGroup.id, UserGroup.user_id, UserGroup.group_id, UserGroup.is_active)
+            .where(UserGroup.user_id.in_(users))
+        )
+    }
+    rows.update(memberships)
+    active = [(user_id, group_id) for user_id, group_id, is_active in filter(None, rows.values())
+              if is_active and user_id in users]
+
+    group_ids = {group_id for _, group_id in active}
+    group_programs = dict(connection.execute(
+        db.select(Group.id, Group.program_id).where(Group.id.in_(group_ids))
+    ).all()) if group_ids else {}
+    group_programs.update(programs)
+    cohorts = _cohort_keys(
+        (user_id, group_programs[group_id], group_id)
+        for user_id, group_id in active if group_id in group_programs
+    )
+    return {user_id: cohorts.get(user_id, []) for user_id in users}
+
+def _rollup_deltas(changes, cohorts, previous_cohorts=None):
+    """Fold (sign, attempt key, values) changes into per-row column deltas.
+    Removals (sign -1) go to a user's previous_cohorts when given.
+    """
+    previous_cohorts = previous_cohorts or {}
+    deltas = {}
+    for sign, (day, test_set, user_id), values in changes:
+        week = day - timedelta(days=day.weekday())
+        user_cohorts = previous_cohorts.get(user_id) if sign < 0 and user_id in previous_cohorts \
+            else cohorts.get(user_id, [])
+        for program_id, group_id in [(0, 0)] + user_cohorts:
+            for period, start in (('day', day), ('week', week)):
+                row = deltas.setdefault((period, start, test_set, program_id, group_id), {})
+                for column, value in values.items():
+                    row[column] = row.get(column, 0) + sign * value
+    return deltas
+
+def _apply_rollup_changes(connection, changes, previous_cohorts=None):
+    """Add attempt contributions (sign +1) and remove old ones (-1), one UPDATE
+    (or INSERT for a new row) per touched rollup row, in the caller's transaction.
+    Removals use previous_cohorts for users whose memberships changed.
+    """
+    if not changes:
+        return
+    cohorts = _user_cohorts(connection, {key[2] for _, key, _ in changes})
+    table = ScoreRollup.__table__
+    deltas = _rollup_deltas(changes, cohorts, previous_cohorts)
+    for (period, start, test_set, program_id, group_id), values in deltas.items():
+        values = {column: value for column, value in values.items() if value}
+        if not values:
+            continue
+        updated = connection.execute(
+            table.update().where(
+                table.c.period == period, table.c.period_start == start, table.c.test_set == test_set,
+                table.c.program_id == program_id, table.c.group_id == group_id
+            ).values({column: table.c[column] + value for column, value in values.items()})
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(
+                period=period, period_start=start, test_set=test_set,
+                program_id=program_id, group_id=group_id, **values
+            ))
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_score_rollups(session, flush_context):
+    """Apply this flush's attempt inserts, deletes and rollup-relevant updates to score_rollups,
+    and move the attempts of students whose cohorts changed to their new cohort rows
+    """
+    changes = []
+    changed_attempts = set()
+
+    def add(state, value_of, sign):
+        changed_attempts.add(state.obj().id)
+        contribution = _rollup_contribution(lambda name: value_of(state, name))
+        if contribution:
+            changes.append((sign,) + contribution)
+
+    for obj in session.new:
+        if isinstance(obj, ExamAttempt):
+            add(db.inspect(obj), _new_value, 1)
+    for obj in session.deleted:
+        if isinstance(obj, ExamAttempt):
+            add(db.inspect(obj), _old_value, -1)
+    for obj in session.dirty:
+        if isinstance(obj, ExamAttempt):
+            state = db.inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in _ROLLUP_ATTRIBUTES):
+                add(state, _new_value, 1)
+                add(state, _old_value, -1)
+
+    connection = session.connection()
+    previous_cohorts = _previous_cohorts(session, connection)
+    current_cohorts = _user_cohorts(connection, previous_cohorts) if previous_cohorts else {}
+    moved = [
+        user_id for user_id, cohorts in previous_cohorts.items()
+        if set(cohorts) != set(current_cohorts.get(user_id, []))
+    ]
+    if moved:
+        # Attempts this flush didn't change: out of the old cohorts, into the new ones.
+        # Changed attempts already leave the old cohorts through previous_cohorts.
+        query = db.select(ExamAttempt.id, *[getattr(ExamAttempt, name) for name in _ROLLUP_ATTRIBUTES])\
+            .where(ExamAttempt.user_id.in_(moved))
+        for row in connection.execute(query):
+            if row.id in changed_attempts:
+                continue
+            contribution = _rollup_contribution(row._mapping.get)
+            if contribution:
+                changes.append((-1,) + contribution)
+                changes.append((1,) + contribution)
+
+    _apply_rollup_changes(connection, changes, previous_cohorts)
+
+def rebuild_score_rollups(since=None):
+    """Recompute the rollups from the attempts: all history, or every week from the
+    one containing `since` (a date) onward. Attempts are attributed to their
+    students' current groups. Returns the number of attempts read. The caller commits.
+    """
+    table = ScoreRollup.__table__
+    query = db.session.query(*[getattr(ExamAttempt, name) for name in _ROLLUP_ATTRIBUTES])
+    delete = table.delete()
+    if since is not None:
+        week = since - timedelta(days=since.weekday())
+        query = query.filter(ExamAttempt.start_time >= datetime(week.year, week.month, week.day))
+        delete = delete.where(table.c.period_start >= week)
+
+    changes = []
+    for row in query.yield_per(2000):
+        contribution = _rollup_contribution(row._mapping.get)
+        if contribution:
+            changes.append((1,) + contribution)
+
+    connection = db.session.connection()
+    connection.execute(delete)
+    rows = [
+        dict(period=period, period_start=start, test_set=test_set,
+             program_id=program_id, group_id=group_id,
+             **{column: values.get(column, 0) for column in _ROLLUP_VALUES})
+        for (period, start, test_set, program_id, group_id), values
+        in _rollup_deltas(changes, _user_cohorts(connection)).items()
+    ]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return len(changes)
+
+def get_score_rollups(period='week', since=None, test_set=None, program_id=None, group_id=None):
+    """Aggregates per period from score_rollups, oldest first, summed over test sets
+    unless one is given. Narrow to a program, or to a group, by id.
+    """
+    query = db.session.query(
+        ScoreRollup.period_start,
+        *[db.func.sum(getattr(ScoreRollup, column)) for column in _ROLLUP_VALUES]
+    ).filter(ScoreRollup.period == period)
+    if group_id:
+        query = query.filter(ScoreRollup.group_id == group_id)
+    else:
+        query = query.filter(ScoreRollup.program_id == (program_id or 0), ScoreRollup.group_id == 0)
+    if since is not None:
+        query = query.filter(ScoreRollup.period_start >= since)
+    if test_set is not None:
+        query = query.filter(ScoreRollup.test_set == test_set)
+
+    series = []
+    for period_start, *sums in query.group_by(ScoreRollup.period_start).order_by(ScoreRollup.period_start):
+        totals = dict(zip(_ROLLUP_VALUES, (int(value or 0) for value in sums)))
+        scored = totals['scored']
+        series.append({
+            'period_start': period_start,
+            'attempts': totals['attempts'],
+            'completions': totals['completions'],
+            'scored': scored,
+            'mean_score': round(totals['score_sum'] / scored, 1) if scored else None,
+            'listening_mean': round(totals['listening_sum'] / scored, 1) if scored else None,
+            'reading_mean': round(totals['reading_sum'] / scored, 1) if scored else None,
+            'histogram': {column: totals[column] for column, _, _ in SCORE_BUCKETS},
+        })
+    return series
+
+# =============================================================================
+# Item Statistics
+# =============================================================================
+
+# Summable ItemStat columns
+_ITEM_STAT_VALUES = (
+    'responses', 'option_a_count', 'option_b_count', 'option_c_count', 'option_d_count',
+    'correct_count', 'score_sum', 'score_sq_sum', 'correct_score_sum'
+)
+
+def item_indices(values):
+    """(p_value, point-biserial discrimination) from ItemStat sums; either may be None"""
+    responses, correct = values['responses'], values['correct_count']
+    if responses <= 0:
+        return None, None
+    p_value = correct / responses
+    if responses < 2 or correct in (0, responses):
+        return p_value, None
+    mean = values['score_sum'] / responses
+    variance = values['score_sq_sum'] / responses - mean * mean
+    if variance <= 0:
+        return p_value, None
+    correct_mean = values['correct_score_sum'] / correct
+    incorrect_mean = (values['score_sum'] - values['correct_score_sum']) / (responses - correct)
+    discrimination = (correct_mean - incorrect_mean) / math.sqrt(variance) * math.sqrt(p_value * (1 - p_value))
+    return p_value, round(discrimination, 4)
+
+def _item_stat_sums(connection, attempt_ids=None, question_ids=None, exclude_questions=None,
+                    total_scores=None):
+    """{question_id: {column: sum}} over the answered responses of scored attempts
+    (or just the given ones). total_scores ({attempt_id: score}) overrides the stored
+    total_score, e.g. to remove an attempt's contribution under its old score.
+    """
+    score = ExamAttempt.total_score
+    is_scored = ExamAttempt.total_score.isnot(None)
+    if total_scores:
+        score = db.case(total_scores, value=Answer.attempt_id, else_=ExamAttempt.total_score)
+        # The stored score may already be NULL, e.g. an attempt being unscored
+        is_scored = db.or_(is_scored, Answer.attempt_id.in_(list(total_scores)))
+    correct = db.case((Answer.is_correct == True, 1), else_=0)
+    selected = db.func.upper(db.func.trim(Answer.selected_answer))
+
+    query = db.select(
+        Answer.question_id,
+        db.func.count(Answer.id),
+        *[db.func.sum(db.case((selected == option, 1), else_=0)) for option in 'ABCD'],
+        db.func.sum(correct),
+        db.func.sum(score),
+        db.func.sum(score * score),
+        db.func.sum(correct * score)
+    ).join(ExamAttempt, Answer.attempt_id == ExamAttempt.id)\
+        .where(Answer.selected_answer.isnot(None), Answer.selected_answer != '', is_scored)\
+        .group_by(Answer.question_id)
+    if attempt_ids is not None:
+        query = query.where(Answer.attempt_id.in_(list(attempt_ids)))
+    if question_ids is not None:
+        query = query.where(Answer.question_id.in_(list(question_ids)))
+    if exclude_questions:
+        query = query.where(Answer.question_id.notin_(list(exclude_questions)))
+
+    return {
+        question_id: dict(zip(_ITEM_STAT_VALUES, (int(value or 0) for value in sums)))
+        for question_id, *sums in connection.execute(query)
+    }
+
+def _apply_item_stat_changes(connection, changes):
+    """Add (sign +1) or remove (-1) _item_stat_sums() results, one UPDATE (or INSERT)
+    per touched question, then refresh their p-values and discrimination.
+    """
+    deltas = {}
+    for sign, sums in changes:
+        for question_id, values in sums.items():
+            row = deltas.setdefault(question_id, {})
+            for column, value in values.items():
+                row[column] = row.get(column, 0) + sign * value
+    deltas = {
+        question_id: {column: value for column, value in values.items() if value}
+        for question_id, values in deltas.items()
+    }
+    deltas = {question_id: values for question_id, values in deltas.items() if values}
+    if not deltas:
+        return
+
+    table = ItemStat.__table__
+    now = datetime.utcnow()
+    for question_id, values in deltas.items():
+        updated = connection.execute(
+            table.update().where(table.c.question_id == question_id)
+            .values(updated_at=now, **{column: table.c[column] + value for column, value in values.items()})
+        ).rowcount
+        if not updated:
+            connection.execute(table.insert().values(question_id=question_id, updated_at=now, **values))
+
+    question_ids = list(deltas)
+    indices = []
+    for i in range(0, len(question_ids), 500):
+        rows = connection.execute(
+            db.select(table.c.question_id, *[table.c[column] for column in _ITEM_STAT_VALUES])
+            .where(table.c.question_id.in_(question_ids[i:i + 500]))
+        )
+        for question_id, *sums in rows:
+            p_value, discrimination = item_indices(dict(zip(_ITEM_STAT_VALUES, sums)))
+            indices.append({'qid': question_id, 'p': p_value, 'r': discrimination})
+    connection.execute(
+        table.update().where(table.c.question_id == db.bindparam('qid'))
+        .values(p_value=db.bindparam('p'), discrimination=db.bindparam('r')),
+        indices
+    )
+
+@event.listens_for(db.session, 'after_flush')
+def _maintain_item_stats(session, flush_context):
+    """Count the responses of attempts scored (or rescored) in this flush into item_stats"""
+    scored, old_scores = [], {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, ExamAttempt):
+            continue
+        state = db.inspect(obj)
+        old, new = _old_value(state, 'total_score'), _new_value(state, 'total_score')
+        if obj in session.new:
+            old = None
+        if old == new:
+            continue
+        if old is not None:
+            old_scores[obj.id] = old
+        if new is not None:
+            scored.append(obj.id)
+    if not scored and not old_scores:
+        return
+
+    connection = session.connection()
+    changes = []
+    if old_scores:
+        changes.append((-1, _item_stat_sums(connection, old_scores, total_scores=old_scores)))
+    if scored:
+        changes.append((1, _item_stat_sums(connection, scored)))
+    _apply_item_stat_changes(connection, changes)
+
+def rebuild_item_stats(question_ids=None):
+    """Recompute item_stats from the answers of scored attempts, for every question
+    or just the given ones. Returns the number of questions with responses. The caller commits.
+    """
+    connection = db.session.connection()
+    table = ItemStat.__table__
+    delete = table.delete()
+    if question_ids is not None:
+        question_ids = list(question_ids)
+        delete = delete.where(table.c.question_id.in_(question_ids))
+    sums = _item_stat_sums(connection, question_ids=question_ids)
+
+    connection.execute(delete)
+    now = datetime.utcnow()
+    rows = []
+    for question_id, values in sums.items():
+        p_value, discrimination = item_indices(values)
+        rows.append(dict(values, question_id=question_id, p_value=p_value,
+                         discrimination=discrimination, updated_at=now))
+    if rows:
+        connection.execute(table.insert(), rows)
+    return len(rows)
+
+# =============================================================================
+# Cohort Statistics
+# =============================================================================
+
+# ExamAttempt attributes the cohort stats read
+_COHORT_ATTEMPT_ATTRIBUTES = ('user_id', 'is_completed', 'total_score')
+
+def _invalidate_cohorts(connection, group_ids=(), program_ids=(), year_ids=()):
+    """Mark the given nodes and all their ancestors stale; other nodes keep their cache"""
+    group_ids, program_ids, year_ids = set(group_ids), set(program_ids), set(year_ids)
+    if group_ids:
+        program_ids.update(connection.execute(
+            db.select(Group.program_id).where(Group.id.in_(list(group_ids)))
+        ).scalars())
+    if program_ids:
+        year_ids.update(connection.execute(
+            db.select(Program.year_id).where(Program.id.in_(list(program_ids)))
+        ).scalars())
+
+    table = CohortStat.__table__
+    nodes = [
+        db.and_(table.c.node_type == node_type, table.c.node_id.in_(list(node_ids)))
+        for node_type, node_ids in (('group', group_ids), ('program', program_ids), ('year', year_ids))
+        if node_ids
+    ]
+    if nodes:
+        connection.execute(
+            table.update().where(db.or_(*nodes)).values(is_stale=True, version=table.c.version + 1)
+        )
+
+def invalidate_cohort_stats():
+    """Mark every cached cohort stale, e.g. after bulk rescoring. The caller commits."""
+    table = CohortStat.__table__
+    db.session.execute(table.update().values(is_stale=True, version=table.c.version + 1))
+
+@event.listens_for(db.session, 'after_flush')
+def _invalidate_cohort_stats(session, flush_context):
+    """Invalidate the cohorts touched by this flush's membership, hierarchy and attempt changes"""
+    user_ids, group_ids, program_ids, year_ids = set(), set(), set(), set()
+
+    def changed(obj, names):
+        if obj in session.new or obj in session.deleted:
+            return True
+        state = db.inspect(obj)
+        return any(state.attrs[name].history.has_changes() for name in names)
+
+    def values(obj, name):
+        state = db.inspect(obj)
+        return {value for value in (_old_value(state, name), _new_value(state, name)) if value is not None}
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, ExamAttempt) and changed(obj, _COHORT_ATTEMPT_ATTRIBUTES):
+            user_ids |= values(obj, 'user_id')
+        elif isinstance(obj, UserGroup) and changed(obj, ('group_id', 'is_active')):
+            group_ids |= values(obj, 'group_id')
+        elif isinstance(obj, Group) and obj not in session.new and changed(obj, ('program_id',)):
+            program_ids |= values(obj, 'program_id')
+        elif isinstance(obj, Program) and obj not in session.new and changed(obj, ('year_id',)):
+            year_ids |= values(obj, 'year_id')
+
+    connection = session.connection()
+    if user_ids:
+        for cohorts in _user_cohorts(connection, user_ids).values():
+            group_ids.update(group_id for _, group_id in cohorts if group_id)
+    _invalidate_cohorts(connection, group_ids, program_ids, year_ids)
 
 # =============================================================================
 # Initialize RBAC Data
@@ -364,15 +1613,7 @@ def init_rbac_data():
             'name': 'super_admin',
             'display_name': 'Super Administrator',
             'description': 'Full system access with all permissions',
-            'permissions': [
-                'user.create', 'user.read', 'user.update', 'user.delete',
-                'role.create', 'role.read', 'role.update', 'role.delete',
-                'org.create', 'org.read', 'org.update', 'org.delete',
-                'question.create', 'question.read', 'question.update', 'question.delete',
-                'exam.create', 'exam.read', 'exam.update', 'exam.delete',
-                'session.create', 'session.read', 'session.update', 'session.delete',
-                'report.read', 'audit.read', 'system.admin'
-            ]
+            'permissions': list(PERMISSIONS)
         },
         {
             'name': 'exam_admin',
@@ -426,6 +1667,7 @@ def init_rbac_data():
             role = Role(**role_data)
             db.session.add(role)
     
+    invalidate_permissions()
     db.session.commit()
 
 def init_org_data():
@@ -485,4 +1727,5 @@ def init_admin_user():
                 assigned_by=admin_user.id
             )
             db.session.add(user_role)
+            invalidate_permissions()
     db.session.commit()
\ No newline at end of file
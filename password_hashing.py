@@ -0,0 +1,199 @@
+"""
+Bounded pool for password hashing.
+
+Password verification is deliberately expensive (scrypt/PBKDF2). During a login
+storm, running it on every request thread pins all workers and starves exam
+traffic. Hashing therefore runs on a small per-process pool capped at
+PASSWORD_HASH_WORKERS concurrent hashes. At most PASSWORD_HASH_QUEUE more
+requests may wait for a slot. Anything beyond that is shed immediately: the
+request gets a 503 with Retry-After instead of queueing behind the storm.
+
+hashlib releases the GIL while hashing, so the cap bounds CPU use. Other
+request threads (gthread/async workers) keep serving save_answer traffic.
+
+Stored hashes are upgraded on a successful login when their method or cost
+differs from PASSWORD_HASH_METHOD.
+"""
+
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, has_app_context, make_response
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# werkzeug's default; use a fully qualified method (e.g. "pbkdf2:sha256:1000000") to change cost
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool is full; retry_after is a hint in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing capacity exceeded')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """Fixed-size hashing pool with an admission limit and wait-time metrics"""
+
+    def __init__(self, workers=2, queue_size=16, timeout=10.0):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._executor = None
+        self._pid = None
+
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._total_service = 0.0
+
+    def _ensure_started(self):
+        """Create the pool in this process (first use, or first use after a fork)"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='password-hash')
+
+    def _retry_after(self):
+        """Seconds until the current backlog should have drained (at least 1)"""
+        with self._lock:
+            service = self._total_service / self._completed if self._completed else 0.5
+            backlog = self._in_flight
+        return max(1, math.ceil(backlog * service / self.workers))
+
+    def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result, or raise HashingOverloaded"""
+        self._ensure_started()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingOverloaded(self._retry_after())
+
+        enqueued = time.monotonic()
+        with self._lock:
+            self._in_flight += 1
+
+        def task():
+            started = time.monotonic()
+            waited = started - enqueued
+            with self._lock:
+                self._running += 1
+                self._total_wait += waited
+                self._max_wait = max(self._max_wait, waited)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._in_flight -= 1
+                    self._completed += 1
+                    self._total_service += time.monotonic() - started
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(task)
+        except RuntimeError:
+            # Pool shut down (interpreter exit)
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+            raise
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The hash still finishes in the background and frees its slot
+            with self._lock:
+                self._timed_out += 1
+            raise HashingOverloaded(self._retry_after())
+
+    def metrics(self):
+        with self._lock:
+            completed = self._completed
+            return {
+                'workers': self.workers,
+                'queue_capacity': self.queue_size,
+                'running': self._running,
+                'queue_depth': self._in_flight - self._running,
+                'completed': completed,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+                'avg_wait_ms': round(self._total_wait / completed * 1000, 1) if completed else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 1),
+                'avg_hash_ms': round(self._total_service / completed * 1000, 1) if completed else 0.0,
+            }
+
+
+# =============================================================================
+# Module-level helpers used by the models and routes
+# =============================================================================
+
+_hasher = None
+_method_prefixes = {}
+
+def init_password_hashing(app):
+    """Create this app's hashing pool and turn HashingOverloaded into a 503"""
+    global _hasher
+    _hasher = PasswordHasher(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        queue_size=app.config.get('PASSWORD_HASH_QUEUE', 16),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+    )
+
+    @app.errorhandler(HashingOverloaded)
+    def hashing_overloaded(error):
+        response = make_response('The server is busy signing people in. Please try again in a moment.', 503)
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response
+
+    return _hasher
+
+def password_hash_method():
+    """Configured werkzeug hash method"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_PASSWORD_HASH_METHOD)
+    return DEFAULT_PASSWORD_HASH_METHOD
+
+def _method_prefix(method):
+    """Canonical "method:params" prefix werkzeug writes for a configured method"""
+    if method not in _method_prefixes:
+        _method_prefixes[method] = generate_password_hash('', method=method).split('$', 1)[0]
+    return _method_prefixes[method]
+
+def _run(fn, *args):
+    if _hasher is None:
+        return fn(*args)
+    return _hasher.run(fn, *args)
+
+def hash_password(plain_password):
+    """Hash with the configured method on the hashing pool"""
+    return _run(generate_password_hash, plain_password, password_hash_method())
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _method_prefix(password_hash_method())
+
+def verify_user_password(user, plain_password):
+    """Check a user's password on the hashing pool. On success an outdated hash
+    is replaced with one using the configured method; the caller commits.
+    Raises HashingOverloaded when the pool is full.
+    """
+    if not user.password_hash or not _run(check_password_hash, user.password_hash, plain_password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(plain_password)
+    return True
+
+def hashing_metrics():
+    return _hasher.metrics() if _hasher is not None else None
@@ -0,0 +1,181 @@
+"""
+Aggregates behind the admin user performance report.
+
+Per-student figures (attempts, average, best, last attempt) come from one
+GROUP BY user_id query over scored completed attempts, sorted and paginated in
+SQL. Scores are the scaled total_score (0-990); attempts without one (never
+scored, see backfill_exam_scores.py) are left out rather than counted as zero.
+Each worker caches the report summary and the aggregate pages it has served,
+stamped with the shared EXAM_RESULTS_CACHE version. Any flush that completes,
+rescores or deletes an attempt bumps that version, so the cache stays current.
+Only the page's users are loaded fresh on every request, by primary key.
+"""
+
+import threading
+import time
+
+from models import db, User, ExamAttempt, EXAM_RESULTS_CACHE, get_cache_version
+from models import SCORE_BUCKETS as _TOTAL_SCORE_BUCKETS
+
+# How often (seconds) a worker re-reads the results version stamp
+RESULTS_VERSION_CHECK_INTERVAL = 5
+
+PERFORMANCE_PAGE_SIZE = 50
+
+# Aggregate pages kept per worker for the current version
+MAX_CACHED_PAGES = 256
+
+# Lower bounds of the score distribution buckets (by each student's average total_score)
+SCORE_BUCKETS = tuple(lowest for _, lowest, _ in _TOTAL_SCORE_BUCKETS)
+
+# The attempts the report covers
+_scored = db.and_(ExamAttempt.is_completed == True, ExamAttempt.total_score.isnot(None))
+
+_attempts_count = db.func.count(ExamAttempt.id)
+_avg_score = db.func.avg(ExamAttempt.total_score)
+_best_score = db.func.max(ExamAttempt.total_score)
+_last_attempt = db.func.max(ExamAttempt.end_time)
+
+# ?sort= value -> aggregate expression
+SORT_COLUMNS = {
+    'avg': _avg_score,
+    'best': _best_score,
+    'attempts': _attempts_count,
+    'last': _last_attempt,
+}
+
+
+class StudentPerformance:
+    """One report row: a student's aggregates over their scored attempts"""
+
+    __slots__ = ('user', 'attempts_count', 'avg_score', 'best_score', 'last_attempt')
+
+    def __init__(self, user, attempts_count, avg_score, best_score, last_attempt):
+        self.user = user
+        self.attempts_count = attempts_count
+        self.avg_score = avg_score
+        self.best_score = best_score
+        self.last_attempt = last_attempt
+
+
+_pages = {}
+_summary = None
+_lock = threading.Lock()
+_cached_version = None
+_known_version = None
+_checked_at = 0.0
+
+
+def _current_version():
+    """Shared results version, re-read at most every RESULTS_VERSION_CHECK_INTERVAL"""
+    global _known_version, _checked_at
+    now = time.monotonic()
+    if _known_version is None or now - _checked_at >= RESULTS_VERSION_CHECK_INTERVAL:
+        _known_version = get_cache_version(EXAM_RESULTS_CACHE)
+        _checked_at = now
+    return _known_version
+
+
+def _valid_cache():
+    """This worker's cache for the current version, emptied when the version moved on"""
+    global _cached_version, _summary
+    version = _current_version()
+    if _cached_version != version:
+        with _lock:
+            if _cached_version != version:
+                _pages.clear()
+                _summary = None
+                _cached_version = version
+    return version
+
+
+def _per_student():
+    """Subquery: one row of aggregates per student with a scored attempt"""
+    return db.session.query(
+        ExamAttempt.user_id.label('user_id'),
+        _avg_score.label('avg_score'),
+        _best_score.label('best_score'),
+    ).filter(_scored).group_by(ExamAttempt.user_id).subquery()
+
+
+def _build_summary():
+    per_student = _per_student()
+    bucket_columns = []
+    bounds = SCORE_BUCKETS + (None,)
+    for low, high in zip(bounds, bounds[1:]):
+        condition = per_student.c.avg_score >= low
+        if high is not None:
+            condition = db.and_(condition, per_student.c.avg_score < high)
+        bucket_columns.append(db.func.coalesce(db.func.sum(db.case((condition, 1), else_=0)), 0))
+
+    students, avg_score, best_score, *buckets = db.session.query(
+        db.func.count(per_student.c.user_id),
+        db.func.avg(per_student.c.avg_score),
+        db.func.max(per_student.c.best_score),
+        *bucket_columns
+    ).one()
+    total_attempts = db.session.query(_attempts_count).filter(_scored).scalar()
+
+    labels = [f'{lowest}-{highest}' for _, lowest, highest in _TOTAL_SCORE_BUCKETS]
+    return {
+        'total_students': students,
+        'avg_score': round(avg_score, 1) if avg_score is not None else 0,
+        'best_score': best_score or 0,
+        'total_attempts': total_attempts,
+        'distribution': dict(zip(labels, buckets)),
+    }
+
+
+def get_performance_summary():
+    """Report-wide totals and the score distribution, cached until results change"""
+    global _summary
+    version = _valid_cache()
+    summary = _summary
+    if summary is None:
+        summary = _build_summary()
+        with _lock:
+            if _cached_version == version:
+                _summary = summary
+    return summary
+
+
+def _build_page(sort, descending, page, per_page):
+    order = SORT_COLUMNS[sort]
+    order = order.desc() if descending else order.asc()
+    rows = db.session.query(
+        ExamAttempt.user_id, _attempts_count, _avg_score, _best_score, _last_attempt
+    ).filter(_scored)\
+        .group_by(ExamAttempt.user_id)\
+        .order_by(order, ExamAttempt.user_id)\
+        .limit(per_page).offset((page - 1) * per_page).all()
+    return [tuple(row) for row in rows]
+
+
+def get_performance_page(sort='avg', descending=True, page=1, per_page=PERFORMANCE_PAGE_SIZE):
+    """One sorted page of StudentPerformance rows.
+
+    The aggregates are cached per worker until results change; the page's users
+    are loaded with one primary-key query so names and emails are always current.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f'Unknown sort column: {sort}')
+    version = _valid_cache()
+    key = (sort, descending, page, per_page)
+    rows = _pages.get(key)
+    if rows is None:
+        rows = _build_page(sort, descending, page, per_page)
+        with _lock:
+            if _cached_version == version:
+                if len(_pages) >= MAX_CACHED_PAGES:
+                    _pages.clear()
+                _pages[key] = rows
+
+    users = {}
+    if rows:
+        user_ids = [row[0] for row in rows]
+        users = {user.id: user for user in User.query.filter(User.id.in_(user_ids)).all()}
+    return [
+        StudentPerformance(users[user_id], attempts_count, round(avg_score, 2), best_score, last_attempt)
+        for user_id, attempts_count, avg_score, best_score, last_attempt in rows
+        if user_id in users
+    ]
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Recompute the per-question item analysis (item_stats) from scored attempts
+
+The statistics are updated whenever attempts are scored. Run this once to
+backfill history, or to repair drift from tools that bypass the ORM.
+
+    python rebuild_item_stats.py                   # every question
+    python rebuild_item_stats.py --test-set TEST2  # one test set's questions
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import Question, rebuild_item_stats
+
+def main(test_set=None):
+    print("🔄 Recomputing item statistics" + (f" for {test_set}..." if test_set else "..."))
+
+    with app.app_context():
+        try:
+            question_ids = None
+            if test_set:
+                question_ids = [row[0] for row in db.session.query(Question.id)
+                                .filter(Question.test_set == test_set).all()]
+            questions = rebuild_item_stats(question_ids)
+            db.session.commit()
+            print(f"   {questions} questions with responses")
+            print("✅ Item statistics recomputed")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Recompute error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    test_set = None
+    if '--test-set' in sys.argv[1:]:
+        test_set = sys.argv[sys.argv.index('--test-set') + 1]
+    success = main(test_set)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Rebuild the score analytics rollups (score_rollups) from exam attempts
+
+The rollups are updated on every flush. Run this once to backfill history,
+after reorganizing groups, or to repair drift from tools that bypass the ORM.
+
+    python rebuild_score_rollups.py                     # all history
+    python rebuild_score_rollups.py --since 2025-09-01  # from that week onward
+"""
+
+import sys
+import os
+from datetime import date
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import rebuild_score_rollups, ScoreRollup
+
+def main(since=None):
+    print("🔄 Rebuilding score rollups" + (f" from the week of {since}..." if since else "..."))
+
+    with app.app_context():
+        try:
+            attempts = rebuild_score_rollups(since)
+            db.session.commit()
+            print(f"   {attempts} attempts read, {ScoreRollup.query.count()} rollup rows")
+            print("✅ Score rollups rebuilt")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Rebuild error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    since = None
+    if '--since' in sys.argv[1:]:
+        since = date.fromisoformat(sys.argv[sys.argv.index('--since') + 1])
+    success = main(since)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Recompute the admin dashboard counters (stats_counters) from scratch
+
+The counters are updated on every flush. Run this from cron (e.g. nightly) to
+repair drift from raw SQL edits or tools that bypass the ORM.
+"""
+
+import sys
+import os
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import refresh_stats_counters, get_stats_counters
+
+def main():
+    print("🔄 Refreshing dashboard counters...")
+
+    with app.app_context():
+        try:
+            refresh_stats_counters()
+            db.session.commit()
+            for name, value in sorted(get_stats_counters().items()):
+                print(f"   {name}: {value}")
+            print("✅ Dashboard counters refreshed")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Refresh error: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
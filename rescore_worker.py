@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Apply queued answer-key changes to stored exam scores
+
+Changing Question.correct_answer queues the question (see RescoreQueue). This
+worker adjusts the scores of just the attempts that answered queued questions.
+
+    python rescore_worker.py           # drain the queue once
+    python rescore_worker.py --watch   # keep polling every POLL_INTERVAL seconds
+"""
+
+import sys
+import os
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import app, db
+from models import process_rescore_queue
+
+POLL_INTERVAL = 10
+
+def drain_rescore_queue():
+    """Process everything queued; returns the number of attempts adjusted"""
+    with app.app_context():
+        try:
+            return process_rescore_queue()
+        except Exception:
+            db.session.rollback()
+            raise
+
+if __name__ == "__main__":
+    watch = '--watch' in sys.argv[1:]
+    while True:
+        try:
+            adjusted = drain_rescore_queue()
+            if adjusted or not watch:
+                print(f"✅ Adjusted scores of {adjusted} attempts")
+        except Exception as e:
+            print(f"❌ Rescore error: {str(e)}")
+            if not watch:
+                sys.exit(1)
+        if not watch:
+            break
+        time.sleep(POLL_INTERVAL)
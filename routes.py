@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
-from flask import render_template, redirect, url_for, flash, request, jsonify, session, Blueprint
+from flask import render_template, redirect, url_for, flash, request, jsonify, session, Blueprint, Response, stream_with_context, make_response
 from flask_login import login_user, logout_user, login_required, current_user, UserMixin, LoginManager
-from models import User, Question, ExamAttempt, Answer
+from models import User, Question, ExamAttempt, Answer, bump_state_version, claim_attempts
 from forms import LoginForm, RegistrationForm
 from utils import calculate_time_remaining
+from exam_cache import get_test_set_snapshot
+from answer_journal import store_answers, flush_attempt_answers
+from exam_events import event_stream, publish_answers, publish_submitted
+from login_throttle import login_retry_after, record_login_failure, reset_login_failures
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import app
 from models import db, init_sample_questions
@@ -29,11 +33,19 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
+        # Throttled before any database query or password hash
+        retry_after = login_retry_after(form.email.data, request.remote_addr)
+        if retry_after:
+            flash('Too many failed sign-in attempts. Please wait a few minutes and try again.', 'error')
+            response = make_response(render_template('login.html', form=form), 429)
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+        
         user = User.query.filter_by(email=form.email.data).first()
         
-               
         if user and user.check_password(form.password.data):
             #user.reset_failed_attempts()
+            reset_login_failures(form.email.data)
             db.session.commit()
             login_user(user, remember=form.remember_me.data)
             
@@ -52,6 +64,7 @@ def login():
                     next_page = url_for('home')
                 return redirect(next_page)
         else:
+            record_login_failure(form.email.data, request.remote_addr)
             if user:
                 user.failed_login_attempts += 1
                 user.last_failed_login = datetime.utcnow()
@@ -133,14 +146,19 @@ def start_exam():
     db.session.commit()
     return redirect(url_for('exam', attempt_id=attempt.id))
 
+def _attempt_test_set(attempt):
+    """Test set an attempt was assigned, falling back to the session choice"""
+    return attempt.test_set or session.get('test_set') or 'Test 1'
+
 @app.route('/exam/<int:attempt_id>')
 @login_required
 def exam(attempt_id: int):
     attempt = ExamAttempt.query.get_or_404(attempt_id)
-    # Filter questions by selected test set to avoid duplicates across sets
-    selected_test_set = session.get('test_set') or 'Test 1'
-    questions = Question.query.filter_by(test_set=selected_test_set)\
-        .order_by(Question.part, Question.question_number).all()
+    # Filter questions by the attempt's test set to avoid duplicates across sets
+    selected_test_set = _attempt_test_set(attempt)
+    # Served from the per-worker snapshot; no question queries on a warm cache.
+    # Only Part I is rendered inline, the other parts are fetched by exam.js.
+    snapshot = get_test_set_snapshot(selected_test_set)
     
     # Use proper time calculation
     from utils import calculate_time_remaining
@@ -149,11 +167,26 @@ def exam(attempt_id: int):
     return render_template(
         'exam.html',
         attempt=attempt,
-        questions=questions,
+        part_questions=snapshot.part(1),
         time_remaining=time_remaining,
         current_test_set=selected_test_set
     )
 
+@app.route('/exam/<int:attempt_id>/part/<int:part>')
+@login_required
+def exam_part(attempt_id: int, part: int):
+    """HTML fragment with the question blocks of a single part"""
+    attempt = ExamAttempt.query.get_or_404(attempt_id)
+    
+    if attempt.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    if part < 1 or part > 7:
+        return jsonify({'error': 'Invalid part'}), 404
+    
+    snapshot = get_test_set_snapshot(_attempt_test_set(attempt))
+    return render_template('partials/exam_part.html', part=part, questions=snapshot.part(part))
+
 @app.route('/save_answer', methods=['POST'])
 @login_required
 def save_answer():
@@ -171,24 +204,72 @@ def save_answer():
     if hasattr(attempt, 'status') and attempt.status != 'in_progress':
         return jsonify({'error': 'Exam is no longer active'}), 400
     
-    # Resolve question by global question_number
+    # Resolve question number within the attempt's test set (cached map)
     try:
         qnum = int(question_number)
     except (TypeError, ValueError):
         return jsonify({'error': 'Invalid question number'}), 400
-    question = Question.query.filter_by(question_number=qnum).first()
-    if not question:
+    question_id = get_test_set_snapshot(_attempt_test_set(attempt)).question_ids.get(qnum)
+    if question_id is None:
         return jsonify({'error': 'Question not found'}), 404
 
     # Upsert Answer
-    existing = Answer.query.filter_by(attempt_id=attempt.id, question_id=question.id).first()
-    if not existing:
-        existing = Answer(attempt_id=attempt.id, question_id=question.id)
-        db.session.add(existing)
-    existing.selected_answer = (answer or '').strip().upper()[:1]
-    db.session.commit()
+    selected = (answer or '').strip().upper()[:1]
+    store_answers(attempt.id, {question_id: selected})
+    publish_answers(attempt.id, {qnum: selected}, request.form.get('tab_id'))
     
-    return jsonify({'success': True, 'question_number': qnum, 'answer': existing.selected_answer})
+    return jsonify({'success': True, 'question_number': qnum, 'answer': selected})
+
+@app.route('/save_answers', methods=['POST'])
+@login_required
+def save_answers():
+    """Upsert a batch of {question_number: answer} pairs in one transaction"""
+    payload = request.get_json(force=True, silent=True) or {}
+    
+    try:
+        attempt_id = int(payload.get('attempt_id'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid attempt id'}), 400
+    attempt = ExamAttempt.query.get_or_404(attempt_id)
+    
+    # Verify user owns this attempt
+    if attempt.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    # Check if exam is still in progress
+    if attempt.status != 'in_progress':
+        return jsonify({'error': 'Exam is no longer active'}), 400
+    
+    raw_answers = payload.get('answers')
+    if not isinstance(raw_answers, dict):
+        return jsonify({'error': 'Invalid answers'}), 400
+    
+    batch = {}
+    rejected = []
+    for question_number, answer in raw_answers.items():
+        try:
+            batch[int(question_number)] = str(answer or '').strip().upper()[:1]
+        except (TypeError, ValueError):
+            rejected.append(question_number)
+    
+    # Resolve question numbers within the attempt's test set (cached map)
+    question_ids = get_test_set_snapshot(_attempt_test_set(attempt)).question_ids
+    
+    saved = {}
+    selections = {}
+    for question_number, answer in batch.items():
+        question_id = question_ids.get(question_number)
+        if question_id is None:
+            rejected.append(question_number)
+            continue
+        selections[question_id] = answer
+        saved[question_number] = answer
+    
+    if selections:
+        store_answers(attempt.id, selections)
+        publish_answers(attempt.id, saved, payload.get('tab_id'))
+    
+    return jsonify({'success': True, 'saved': saved, 'rejected': rejected})
 
 @app.route('/submit_exam', methods=['POST'])
 @login_required
@@ -201,43 +282,184 @@ def submit_exam():
         flash('Access denied', 'error')
         return redirect(url_for('home'))
     
+    # Already submitted, e.g. by the expired-attempt sweeper; the claim settles a concurrent race
+    if attempt.status != 'in_progress' or not claim_attempts([attempt.id], 'completed'):
+        db.session.rollback()
+        flash('This exam has already been submitted.', 'info')
+        return redirect(url_for('results'))
+    
+    # Pull in answers still waiting in the write-behind journal before scoring
+    flush_attempt_answers(attempt.id)
+    
     # Mark as completed and calculate scores
     attempt.status = 'completed'
     attempt.end_time = datetime.utcnow()
+    bump_state_version(attempt.id)
     scores = attempt.calculate_scores()
     db.session.commit()
+    publish_submitted(attempt)
     
     flash('Exam submitted successfully!', 'success')
     return redirect(url_for('results'))
 
+# Attempts per results page
+RESULTS_PAGE_SIZE = 20
+
+# Stored summary columns the results page reads; answers are never loaded
+_RESULTS_COLUMNS = (
+    ExamAttempt.id, ExamAttempt.start_time, ExamAttempt.end_time, ExamAttempt.status,
+    ExamAttempt.answered_count, ExamAttempt.listening_correct, ExamAttempt.reading_correct,
+    ExamAttempt.listening_score, ExamAttempt.reading_score, ExamAttempt.total_score
+)
+
+def _parse_results_cursor(cursor):
+    """'<end_time iso>_<id>' -> (end_time, id), 'none_<id>' -> (None, id) for
+    attempts without an end time, or None when absent/invalid
+    """
+    try:
+        end_time, attempt_id = cursor.rsplit('_', 1)
+        return (None if end_time == 'none' else datetime.fromisoformat(end_time)), int(attempt_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _results_cursor(attempt):
+    end_time = attempt.end_time.isoformat() if attempt.end_time else 'none'
+    return f"{end_time}_{attempt.id}"
+
 @app.route('/results')
 @login_required
 def results():
-    attempts = ExamAttempt.query.filter_by(user_id=current_user.id)\
-                               .filter(ExamAttempt.status.in_(['completed', 'auto_submitted']))\
-                               .order_by(ExamAttempt.end_time.desc()).all()
+    """Submitted attempts, newest first, keyset-paginated over (end_time, id).
+    Attempts submitted without an end time (legacy rows) come last.
+    """
+    submitted = db.and_(
+        ExamAttempt.user_id == current_user.id,
+        ExamAttempt.status.in_(['completed', 'auto_submitted'])
+    )
+    query = ExamAttempt.query.options(db.load_only(*_RESULTS_COLUMNS)).filter(submitted)
     
-    return render_template('results.html', attempts=attempts)
+    cursor = _parse_results_cursor(request.args.get('before'))
+    if cursor:
+        end_time, attempt_id = cursor
+        if end_time is None:
+            query = query.filter(ExamAttempt.end_time.is_(None), ExamAttempt.id < attempt_id)
+        else:
+            query = query.filter(db.or_(
+                ExamAttempt.end_time < end_time,
+                db.and_(ExamAttempt.end_time == end_time, ExamAttempt.id < attempt_id),
+                ExamAttempt.end_time.is_(None)
+            ))
+    
+    attempts = query.order_by(ExamAttempt.end_time.desc().nulls_last(), ExamAttempt.id.desc())\
+                    .limit(RESULTS_PAGE_SIZE + 1).all()
+    next_cursor = None
+    if len(attempts) > RESULTS_PAGE_SIZE:
+        attempts = attempts[:RESULTS_PAGE_SIZE]
+        next_cursor = _results_cursor(attempts[-1])
+    
+    # Totals across every page in one aggregate query
+    total_attempts, best_score, average_score, completed_count = db.session.query(
+        db.func.count(ExamAttempt.id),
+        db.func.max(ExamAttempt.total_score),
+        db.func.avg(ExamAttempt.total_score),
+        db.func.sum(db.case((ExamAttempt.status == 'completed', 1), else_=0))
+    ).filter(submitted).one()
+    summary = {
+        'total_attempts': total_attempts,
+        'best_score': best_score,
+        'average_score': int(round(average_score)) if average_score is not None else None,
+        'completed': int(completed_count or 0)
+    }
+    
+    return render_template('results.html', attempts=attempts, summary=summary,
+                           next_cursor=next_cursor, is_first_page=cursor is None)
 
-@app.route('/get_exam_state/<int:attempt_id>')
+@app.route('/results/<int:attempt_id>/answers')
 @login_required
-def get_exam_state(attempt_id):
+def result_answers(attempt_id):
+    """Per-question answer details of a submitted attempt, fetched when its modal opens"""
+    state = db.session.query(ExamAttempt.user_id, ExamAttempt.status)\
+        .filter(ExamAttempt.id == attempt_id).first()
+    if state is None:
+        return jsonify({'error': 'Attempt not found'}), 404
+    if state.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    # Answer keys stay hidden while the exam is still running
+    if state.status == 'in_progress':
+        return jsonify({'error': 'Exam has not been submitted'}), 400
+    
+    rows = db.session.query(
+        Question.question_number, Question.part, Answer.selected_answer,
+        Question.correct_answer, Answer.is_correct
+    ).join(Question, Answer.question_id == Question.id)\
+        .filter(Answer.attempt_id == attempt_id)\
+        .order_by(Question.question_number).all()
+    
+    return jsonify({
+        'attempt_id': attempt_id,
+        'answers': [{
+            'question_number': row.question_number,
+            'part': row.part,
+            'selected_answer': row.selected_answer,
+            'correct_answer': row.correct_answer,
+            'is_correct': bool(row.is_correct)
+        } for row in rows]
+    })
+
+@app.route('/exam/<int:attempt_id>/events')
+@login_required
+def exam_events(attempt_id):
+    """Server-sent events: the deadline once, then deltas for this attempt"""
     attempt = ExamAttempt.query.get_or_404(attempt_id)
     
     if attempt.user_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
     
-    time_remaining = calculate_time_remaining(attempt)
+    response = Response(stream_with_context(event_stream(attempt)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/get_exam_state/<int:attempt_id>')
+@login_required
+def get_exam_state(attempt_id):
+    """Exam state; with ?since=<version> only answers changed after that version"""
+    since = request.args.get('since', type=int)
+    
+    # One indexed single-row lookup; no relationship loads
+    state = db.session.query(
+        ExamAttempt.user_id, ExamAttempt.status, ExamAttempt.start_time,
+        ExamAttempt.extended_seconds, ExamAttempt.state_version
+    ).filter(ExamAttempt.id == attempt_id).first()
+    if state is None:
+        return jsonify({'error': 'Not found'}), 404
+    
+    if state.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    
+    version = state.state_version or 0
+    if since is not None and since >= version:
+        return '', 304
+    
+    time_remaining = calculate_time_remaining(state)
     
-    # Get answers from the relationship
-    answers = {}
-    for answer in attempt.answers:
-        answers[answer.question_id] = answer.selected_answer
+    # Answers keyed by question number, as used by the exam page
+    query = db.session.query(Question.question_number, Answer.selected_answer)\
+        .join(Question, Answer.question_id == Question.id)\
+        .filter(Answer.attempt_id == attempt_id)
+    if since is not None:
+        query = query.filter(Answer.version > since)
+    answers = {number: selected for number, selected in query}
     
     # Count answered questions
-    answered_count = len([a for a in answers.values() if a])
+    answered_count = db.session.query(db.func.count(Answer.id))\
+        .filter(Answer.attempt_id == attempt_id, Answer.selected_answer.isnot(None),
+                Answer.selected_answer != '').scalar()
     
     return jsonify({
+        'version': version,
+        'since': since,
+        'status': state.status,
         'time_remaining': max(0, time_remaining),
         'answers': answers,
         'answered_count': answered_count,
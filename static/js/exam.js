@@ -5,7 +5,18 @@ class TOEICExam {
         this.currentQuestion = 1;
         this.answers = {};
         this.attemptId = ATTEMPT_ID;
-        this.saveTimeout = null;
+        // Identifies this tab so it can ignore the echo of its own saves
+        this.tabId = Math.random().toString(36).slice(2);
+        // Server state version of the last state we applied (see syncState)
+        this.stateVersion = null;
+        // Answers changed since the last successful flush, keyed by question number
+        this.pendingAnswers = {};
+        this.flushPromise = null;
+        this.flushIntervalMs = 2000;
+        // Part fragments already in the DOM (Part I is rendered inline) and in-flight fetches
+        this.loadedParts = new Set();
+        this.partRequests = {};
+        this.questionObserver = this.createQuestionObserver();
         this.initializeExam();
         this.bindEvents();
         this.loadSavedAnswers();
@@ -23,8 +34,77 @@ class TOEICExam {
             7: { start: 153, end: 200, name: 'Part VII' }
         };
 
+        document.querySelectorAll('.part-questions[data-loaded="true"]').forEach(container => {
+            this.loadedParts.add(parseInt(container.id.replace('part-questions-', ''), 10));
+            this.observeQuestions(container);
+        });
+
         this.updateNavigator();
         this.updateProgress();
+
+        // Warm the next part while the student works on the first one
+        this.showPart(this.currentPart);
+    }
+
+    createQuestionObserver() {
+        // Track the question in the middle of the viewport
+        if (!('IntersectionObserver' in window)) return null;
+        return new IntersectionObserver((entries) => {
+            entries.forEach(entry => {
+                if (entry.isIntersecting) {
+                    const questionNumber = parseInt(entry.target.id.replace('question-', ''));
+                    this.currentQuestion = questionNumber;
+                    this.updateCurrentQuestionIndicator();
+                }
+            });
+        }, {
+            root: null,
+            rootMargin: '-50% 0px -50% 0px',
+            threshold: 0
+        });
+    }
+
+    observeQuestions(root) {
+        if (!this.questionObserver) return;
+        root.querySelectorAll('.question-block').forEach(block => {
+            this.questionObserver.observe(block);
+        });
+    }
+
+    loadPart(partNumber) {
+        // Fetch a part's question blocks once; concurrent callers share the request
+        if (this.loadedParts.has(partNumber)) return Promise.resolve();
+        if (this.partRequests[partNumber]) return this.partRequests[partNumber];
+
+        const container = document.getElementById(`part-questions-${partNumber}`);
+        if (!container) return Promise.resolve();
+
+        this.partRequests[partNumber] = fetch(`/exam/${this.attemptId}/part/${partNumber}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                return response.text();
+            })
+            .then(html => {
+                container.innerHTML = html;
+                container.dataset.loaded = 'true';
+                this.loadedParts.add(partNumber);
+                this.restoreSelections(container);
+                this.observeQuestions(container);
+            })
+            .catch(error => {
+                console.error(`Error loading Part ${partNumber}:`, error);
+            })
+            .finally(() => {
+                delete this.partRequests[partNumber];
+            });
+        return this.partRequests[partNumber];
+    }
+
+    showPart(partNumber) {
+        // Load the visible part, then prefetch one part ahead
+        return this.loadPart(partNumber).then(() => {
+            if (partNumber < 7) this.loadPart(partNumber + 1);
+        });
     }
 
     bindEvents() {
@@ -117,7 +197,13 @@ class TOEICExam {
             });
         }
 
-        // Auto-save on page unload
+        // Flush pending answers periodically, when the tab is hidden and on page unload
+        this.flushTimer = setInterval(() => {
+            if (!this.flushPromise) this.flushAnswers();
+        }, this.flushIntervalMs);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') this.saveAllAnswers();
+        });
         window.addEventListener('beforeunload', () => {
             this.saveAllAnswers();
         });
@@ -161,9 +247,9 @@ class TOEICExam {
         this.updateNavigator();
         this.updateNavigationButtons();
 
-        // Scroll to first question of the part
+        // Scroll to first question of the part once its questions are loaded
         const firstQuestion = this.partRanges[this.currentPart].start;
-        this.goToQuestion(firstQuestion);
+        this.showPart(this.currentPart).then(() => this.goToQuestion(firstQuestion));
     }
 
     goToQuestion(questionNumber) {
@@ -180,15 +266,17 @@ class TOEICExam {
         this.updateQuestionBubble(questionNumber);
         this.updateProgress();
         
-        // Debounced auto-save
-        clearTimeout(this.saveTimeout);
-        this.saveTimeout = setTimeout(() => {
-            this.saveToServer(questionNumber, answer);
-        }, 300);
+        // Queued; sent with the next batch flush
+        this.pendingAnswers[questionNumber] = answer;
     }
 
     // Centralized handler to keep UI in sync no matter the source of selection
     handleSelection(questionNumber, answer) {
+        this.renderSelection(questionNumber, answer);
+        this.saveAnswer(questionNumber, answer);
+    }
+
+    renderSelection(questionNumber, answer) {
         // 1) Update content radio
         const radio = document.querySelector(`input[name="question_${questionNumber}"][value="${answer}"]`);
         if (radio && !radio.checked) {
@@ -206,30 +294,70 @@ class TOEICExam {
                 btn.classList.add('btn-outline-primary');
             }
         });
+    }
 
-        // 3) Persist
-        this.saveAnswer(questionNumber, answer);
+    applyRemoteAnswers(data) {
+        // Answers saved from another tab; local unsaved picks take precedence
+        if (!data || !data.answers || data.origin === this.tabId) return;
+        Object.entries(data.answers).forEach(([questionNumber, answer]) => {
+            if (questionNumber in this.pendingAnswers) return;
+            this.answers[questionNumber] = answer;
+            this.renderSelection(parseInt(questionNumber), answer);
+            this.updateQuestionBubble(parseInt(questionNumber));
+        });
+        this.updateProgress();
     }
 
-    async saveToServer(questionNumber, answer) {
-        try {
-            const formData = new FormData();
-            formData.append('attempt_id', this.attemptId);
-            formData.append('question_number', questionNumber);
-            formData.append('answer', answer);
+    takePendingAnswers() {
+        const batch = this.pendingAnswers;
+        this.pendingAnswers = {};
+        return batch;
+    }
+
+    requeueAnswers(batch) {
+        // Put back a failed batch without overwriting newer selections
+        Object.entries(batch).forEach(([questionNumber, answer]) => {
+            if (!(questionNumber in this.pendingAnswers)) {
+                this.pendingAnswers[questionNumber] = answer;
+            }
+        });
+    }
+
+    flushAnswers() {
+        // Send all pending answers in one request; only one flush is in flight at a time,
+        // so a caller arriving mid-flight waits for it and then sends what is left
+        if (this.flushPromise) return this.flushPromise.then(() => this.flushAnswers());
+        if (Object.keys(this.pendingAnswers).length === 0) return Promise.resolve();
+
+        const batch = this.takePendingAnswers();
+        this.flushPromise = this.saveToServer(batch).finally(() => {
+            this.flushPromise = null;
+        });
+        return this.flushPromise;
+    }
 
-            const response = await fetch('/save_answer', {
+    async saveToServer(batch) {
+        try {
+            const response = await fetch('/save_answers', {
                 method: 'POST',
-                body: formData
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ attempt_id: this.attemptId, answers: batch, tab_id: this.tabId })
             });
 
             if (response.ok) {
                 this.showSaveIndicator();
+            } else if (response.status >= 500) {
+                // Transient server error: retry with the next flush
+                console.error('Failed to save answers');
+                this.requeueAnswers(batch);
+                this.showSaveError();
             } else {
-                console.error('Failed to save answer');
+                console.error('Answers rejected by server');
+                this.showSaveError();
             }
         } catch (error) {
-            console.error('Error saving answer:', error);
+            console.error('Error saving answers:', error);
+            this.requeueAnswers(batch);
             this.showSaveError();
         }
     }
@@ -333,28 +461,53 @@ class TOEICExam {
 
             if (data.answers) {
                 this.answers = data.answers;
-                
-                // Restore radio button selections
-                Object.entries(data.answers).forEach(([questionNumber, answer]) => {
-                    const radio = document.querySelector(`input[name="question_${questionNumber}"][value="${answer}"]`);
-                    if (radio) {
-                        radio.checked = true;
-                        this.updateQuestionBubble(parseInt(questionNumber));
-                    }
-                });
-
+                this.restoreSelections(document);
                 this.updateProgress();
             }
+            this.stateVersion = data.version;
         } catch (error) {
             console.error('Error loading saved answers:', error);
         }
     }
 
+    async syncState() {
+        // Fetch only what changed since the last applied version (304 when nothing did)
+        const query = this.stateVersion === null ? '' : `?since=${this.stateVersion}`;
+        try {
+            const response = await fetch(`/get_exam_state/${this.attemptId}${query}`);
+            if (response.status === 304 || !response.ok) return;
+            const data = await response.json();
+
+            this.applyRemoteAnswers({ answers: data.answers });
+            this.stateVersion = data.version;
+            if (window.examTimer && data.time_remaining !== undefined) {
+                window.examTimer.setTimeRemaining(data.time_remaining);
+            }
+        } catch (error) {
+            console.error('Error syncing exam state:', error);
+        }
+    }
+
+    restoreSelections(root) {
+        // Re-check saved answers for radios rendered under root
+        Object.entries(this.answers).forEach(([questionNumber, answer]) => {
+            const radio = root.querySelector(`input[name="question_${questionNumber}"][value="${answer}"]`);
+            if (radio) {
+                radio.checked = true;
+                this.updateQuestionBubble(parseInt(questionNumber));
+            }
+        });
+    }
+
     saveAllAnswers() {
-        // Force save all pending changes
-        if (this.saveTimeout) {
-            clearTimeout(this.saveTimeout);
-            // Could implement a synchronous save here if needed
+        // Hand pending changes to the browser so they survive page unload
+        if (Object.keys(this.pendingAnswers).length === 0) return;
+        const body = JSON.stringify({ attempt_id: this.attemptId, answers: this.pendingAnswers, tab_id: this.tabId });
+        const blob = new Blob([body], { type: 'application/json' });
+        if (navigator.sendBeacon && navigator.sendBeacon('/save_answers', blob)) {
+            this.pendingAnswers = {};
+        } else {
+            this.flushAnswers();
         }
     }
 }
@@ -363,30 +516,3 @@ class TOEICExam {
 document.addEventListener('DOMContentLoaded', () => {
     window.toeicExam = new TOEICExam();
 });
-
-// Intersection Observer for automatic question tracking
-document.addEventListener('DOMContentLoaded', () => {
-    const observerOptions = {
-        root: null,
-        rootMargin: '-50% 0px -50% 0px',
-        threshold: 0
-    };
-
-    const observer = new IntersectionObserver((entries) => {
-        entries.forEach(entry => {
-            if (entry.isIntersecting) {
-                const questionElement = entry.target;
-                const questionNumber = parseInt(questionElement.id.replace('question-', ''));
-                if (window.toeicExam) {
-                    window.toeicExam.currentQuestion = questionNumber;
-                    window.toeicExam.updateCurrentQuestionIndicator();
-                }
-            }
-        });
-    }, observerOptions);
-
-    // Observe all question blocks
-    document.querySelectorAll('.question-block').forEach(block => {
-        observer.observe(block);
-    });
-});
@@ -179,7 +179,10 @@ class ExamTimer {
         
         form.appendChild(attemptIdInput);
         document.body.appendChild(form);
-        form.submit();
+
+        // Make sure queued answers reach the server before scoring
+        const flushed = window.toeicExam ? window.toeicExam.flushAnswers() : Promise.resolve();
+        flushed.finally(() => form.submit());
     }
 
     pause() {
@@ -195,6 +198,17 @@ class ExamTimer {
         this.updateDisplay();
     }
 
+    setTimeRemaining(seconds) {
+        // Server-authoritative time, e.g. after a proctor extension
+        this.timeRemaining = seconds;
+        this.updateDisplay();
+    }
+
+    stop() {
+        this.isRunning = false;
+        clearInterval(this.timerInterval);
+    }
+
     bindEvents() {
         // Handle visibility change (tab switching)
         document.addEventListener('visibilitychange', () => {
@@ -219,13 +233,16 @@ class ExamTimer {
 
     // Method to sync time with server (could be called periodically)
     async syncWithServer() {
+        if (window.toeicExam) {
+            // Delta sync: answers and time changed since the last known version
+            return window.toeicExam.syncState();
+        }
         try {
             const response = await fetch(`/get_exam_state/${ATTEMPT_ID}`);
             const data = await response.json();
             
             if (data.time_remaining !== undefined) {
-                this.timeRemaining = data.time_remaining;
-                this.updateDisplay();
+                this.setTimeRemaining(data.time_remaining);
             }
         } catch (error) {
             console.error('Failed to sync time with server:', error);
@@ -233,15 +250,57 @@ class ExamTimer {
     }
 }
 
-// Initialize timer when DOM is ready
-document.addEventListener('DOMContentLoaded', () => {
-    if (typeof TIME_REMAINING !== 'undefined') {
-        window.examTimer = new ExamTimer(TIME_REMAINING);
-        
+// Server-pushed exam state; falls back to polling where EventSource is unavailable
+function connectExamEvents() {
+    if (!window.EventSource) {
         // Sync with server every 30 seconds
         setInterval(() => {
             window.examTimer.syncWithServer();
         }, 30000);
+        return;
+    }
+
+    const source = new EventSource(`/exam/${ATTEMPT_ID}/events`);
+    let reconnecting = false;
+
+    // After a network blip, catch up with a cheap delta request
+    source.addEventListener('error', () => {
+        reconnecting = true;
+    });
+    source.addEventListener('open', () => {
+        if (reconnecting && window.toeicExam) window.toeicExam.syncState();
+        reconnecting = false;
+    });
+
+    source.addEventListener('deadline', (e) => {
+        const data = JSON.parse(e.data);
+        window.examTimer.setTimeRemaining(data.time_remaining);
+    });
+
+    source.addEventListener('answers', (e) => {
+        if (window.toeicExam) {
+            window.toeicExam.applyRemoteAnswers(JSON.parse(e.data));
+        }
+    });
+
+    source.addEventListener('submitted', () => {
+        source.close();
+        // Submitted elsewhere (another tab or the server); skip if this page is submitting
+        const submitBtn = document.getElementById('submitExamBtn');
+        if (submitBtn && submitBtn.disabled) return;
+        window.examTimer.stop();
+        if (submitBtn) submitBtn.disabled = true;
+        window.location.href = '/results';
+    });
+
+    window.examEvents = source;
+}
+
+// Initialize timer when DOM is ready
+document.addEventListener('DOMContentLoaded', () => {
+    if (typeof TIME_REMAINING !== 'undefined') {
+        window.examTimer = new ExamTimer(TIME_REMAINING);
+        connectExamEvents();
     }
 });
 
@@ -11,6 +11,7 @@ except Exception:
 
 from app import app
 from models import db, Question
+from exam_cache import invalidate_question_bank
 
 
 def normalize_path(p: str) -> str:
@@ -137,6 +138,7 @@ def sync_images(xlsx_path: str, sheets: list[str]) -> None:
                         q.image_file = new_val
                         updates += 1
 
+            invalidate_question_bank()
             db.session.commit()
             print(f"Updated {updates} images for {test_set} from sheet '{sheet}'")
 
@@ -0,0 +1,70 @@
+"""
+/results keyset pagination, including submitted attempts without an end time
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from urllib.parse import unquote
+
+_DB_FILE = os.path.join(tempfile.mkdtemp(), 'test.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{_DB_FILE}'
+os.environ['AUDIT_ASYNC'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import routes
+from main import app, db
+from models import User, ExamAttempt
+
+
+def _walk_results(client):
+    """Attempt ids on every /results page, following the Older links"""
+    seen = []
+    cursor = None
+    while True:
+        page = client.get('/results', query_string={'before': cursor} if cursor else None)
+        assert page.status_code == 200
+        html = page.get_data(as_text=True)
+        seen.extend(int(part.split('"', 1)[0]) for part in html.split('data-bs-target="#detailModal')[1:])
+        marker = '/results?before='
+        if marker not in html:
+            return seen
+        cursor = unquote(html.split(marker, 1)[1].split('"', 1)[0])
+
+
+def test_results_pages_include_attempts_without_end_time():
+    with app.app_context():
+        user = User(username='pager', email='pager@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        now = datetime.utcnow()
+        dated = [
+            ExamAttempt(user_id=user.id, status='completed', is_completed=True,
+                        start_time=now - timedelta(hours=i + 2), end_time=now - timedelta(hours=i))
+            for i in range(routes.RESULTS_PAGE_SIZE + 5)
+        ]
+        undated = [
+            ExamAttempt(user_id=user.id, status='auto_submitted', is_completed=True,
+                        start_time=now - timedelta(days=30), end_time=None)
+            for _ in range(routes.RESULTS_PAGE_SIZE)
+        ]
+        db.session.add_all(dated + undated)
+        db.session.commit()
+        user_id = user.id
+        expected = [attempt.id for attempt in dated] + sorted((a.id for a in undated), reverse=True)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    assert _walk_results(client) == expected
+
+
+def test_results_cursor_round_trip_for_missing_end_time():
+    attempt = ExamAttempt(id=7, end_time=None)
+    assert routes._parse_results_cursor(routes._results_cursor(attempt)) == (None, 7)
+    ended = datetime(2025, 1, 2, 3, 4, 5)
+    attempt = ExamAttempt(id=8, end_time=ended)
+    assert routes._parse_results_cursor(routes._results_cursor(attempt)) == (ended, 8)
@@ -1,15 +1,19 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+
+# Total exam time is 120 minutes (7200 seconds)
+EXAM_DURATION_SECONDS = 7200
+
+def exam_deadline(start_time, extended_seconds=0):
+    """Server-authoritative end of an exam, including any granted extension"""
+    return start_time + timedelta(seconds=EXAM_DURATION_SECONDS + (extended_seconds or 0))
 
 def calculate_time_remaining(attempt):
     """Calculate remaining time for an exam attempt in seconds"""
     if attempt.status != 'in_progress':
         return 0
     
-    elapsed = datetime.utcnow() - attempt.start_time
-    elapsed_seconds = int(elapsed.total_seconds())
-    
-    # Total exam time is 120 minutes (7200 seconds)
-    return max(0, 7200 - elapsed_seconds)
+    remaining = exam_deadline(attempt.start_time, attempt.extended_seconds) - datetime.utcnow()
+    return max(0, int(remaining.total_seconds()))
 
 def format_time(seconds):
     """Format seconds into HH:MM:SS format"""